@@ -1,23 +1,225 @@
-from flask import (
-    Flask, render_template, redirect, url_for, flash)
-from utils import get_env, create_folder_name, form_validate
-from werkzeug import secure_filename
-from boto3 import client
-from forms import NetworkUpload
-import os
-from pipe_design import design_format
-from pipe_velocity import velocity_format
-from gutter_spread import spread_format
+import time
+start_time = time.time()
+
+from flask import (  # noqa: E402
+    Flask, render_template, redirect, url_for, flash, abort, Response,
+    request, jsonify)
+from werkzeug.wsgi import wrap_file  # noqa: E402
+from utils import (  # noqa: E402
+    get_env, env_flag, create_folder_name, form_validate, bundle_validate,
+    error_messages, close_uploads, NetworkError, report_columns,
+    empty_error, COPY_CHUNK_SIZE)
+from storage import get_storage  # noqa: E402
+from forms import NetworkUpload  # noqa: E402
+from concurrent.futures import ThreadPoolExecutor  # noqa: E402
+from functools import partial  # noqa: E402
+from collections import OrderedDict  # noqa: E402
+import os  # noqa: E402
+import re  # noqa: E402
+import mimetypes  # noqa: E402
+from jobs import (  # noqa: E402
+    run_job, run_bundle_job, submit_job, get_job, get_spec, warm_up)
+from cache import ResultCache, cache_key  # noqa: E402
+from revisions import series_key  # noqa: E402
+from metrics import (  # noqa: E402
+    start_timer, finish_timer, stage, timed, render_metrics)
 
 application = app = Flask(__name__)
 SECRET_KEY = os.urandom(32)
 app.config['SECRET_KEY'] = SECRET_KEY
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024
+app.config['MAX_CONTENT_LENGTH'] = int(get_env('MAX_CONTENT_LENGTH',
+                                               64 * 1024 * 1024))
+app.config['UPLOAD_LIMITS'] = {
+    'design': int(get_env('DESIGN_UPLOAD_LIMIT', 16 * 1024 * 1024)),
+    'velocity': int(get_env('VELOCITY_UPLOAD_LIMIT', 16 * 1024 * 1024)),
+    'spread': int(get_env('SPREAD_UPLOAD_LIMIT', 16 * 1024 * 1024)),
+    'bundle': int(get_env('BUNDLE_UPLOAD_LIMIT', 48 * 1024 * 1024))}
+app.config['ARCHIVE_ASYNC'] = env_flag('ARCHIVE_ASYNC', True)
+app.config['JOB_MODE'] = get_env('JOB_MODE', 'sync')
+app.config['WARM_UP'] = env_flag('WARM_UP', False)
+app.config['DOWNLOAD_MODE'] = get_env('DOWNLOAD_MODE', 'redirect')
+app.config['TEMPLATE_MAX_AGE'] = int(get_env('TEMPLATE_MAX_AGE',
+                                             365 * 24 * 3600))
+app.config['DOWNLOAD_MAX_AGE'] = int(get_env('DOWNLOAD_MAX_AGE', 24 * 3600))
 
-s3 = client('s3')
-S3_BUCKET = get_env('S3_BUCKET')
+archive_pool = ThreadPoolExecutor(max_workers=2)
+result_cache = ResultCache(max_size=int(get_env('RESULT_CACHE_SIZE', 256)),
+                           ttl=int(get_env('RESULT_CACHE_TTL', 3600)))
 
 format_error = 'File format not supported!'
+folder_pattern = re.compile(r'^[\w:-]+$')
+
+# Report templates never change under their key, formatted files are
+# only written once to a new job folder
+template_cache = ''.join(['public, max-age=',
+                          str(app.config['TEMPLATE_MAX_AGE']), ', immutable'])
+download_cache = ''.join(['private, max-age=',
+                          str(app.config['DOWNLOAD_MAX_AGE'])])
+
+
+def put_csv_files(report, folder_name, names, bodies):
+    '''Write uploaded csv files to storage archive folder'''
+    s3_keys_csv = [''.join([report, '/', folder_name, '/', 'csv', '/', name])
+                   for name in names]
+    get_storage().put_many(s3_keys_csv, bodies)
+
+
+def archive_job(report, folder_name, names, uploads):
+    '''Write csv files off the request path, timed as an archive job'''
+    with timed('archive'):
+        put_csv_files(report, folder_name, names, uploads)
+
+
+def archive_csv_files(report, folder_name, names, uploads):
+    '''Archive uploaded csv files to storage off the request path'''
+    if app.config['ARCHIVE_ASYNC']:
+        future = archive_pool.submit(archive_job, report, folder_name,
+                                     names, uploads)
+        future.add_done_callback(partial(log_archive_error, report,
+                                         folder_name))
+        return future
+    put_csv_files(report, folder_name, names, uploads)
+    return None
+
+
+def log_archive_error(report, folder_name, future):
+    '''Log csv files that could not be archived'''
+    error = future.exception()
+    if error is not None:
+        app.logger.error(''.join(['Archive of ', report, '/', folder_name,
+                                  ' failed: ', repr(error)]))
+
+
+def release_uploads(uploads, futures):
+    '''Remove spooled upload files once archive and formatting finish'''
+    futures = [future for future in futures if future is not None]
+
+    def release(done):
+        if all(future.done() for future in futures):
+            close_uploads(uploads)
+
+    if not futures:
+        close_uploads(uploads)
+    for future in futures:
+        future.add_done_callback(release)
+
+
+def upload_limit(report):
+    '''Return upload size limit of report type'''
+    return app.config['UPLOAD_LIMITS'].get(report)
+
+
+def flash_errors(errors):
+    '''Flash upload validation errors'''
+    for message in error_messages(errors):
+        flash(message, 'danger')
+
+
+def resolve_revision(revision):
+    '''Return job folder of a previous job id or folder name, if valid'''
+    revision = (revision or '').strip()
+    job = get_job(revision)
+    if job is not None:
+        if not job.done() or job.exception() is not None or not job.result():
+            return None
+        revision = job.result().split('/')[1]
+    if not folder_pattern.match(revision):
+        return None
+    return revision
+
+
+def format_uploads(report, uploads, toggles, revision=None):
+    '''Format validated uploads of one report
+
+    Unchanged series of a previous job folder, if given, are reused.'''
+    names = [upload.name for upload in uploads]
+
+    # Skip formatting of previously formatted files
+    with stage('hash'):
+        keys = [series_key(name, upload)
+                for name, upload in zip(names, uploads)]
+        key = cache_key(report, keys, toggles)
+    response = result_cache.get(key)
+    if response:
+        close_uploads(uploads)
+        return format_response(response)
+
+    folder_name = create_folder_name()
+    archive = archive_csv_files(report, folder_name, names, uploads)
+    return run_formatting(key, uploads, archive, run_job, report, uploads,
+                          names, folder_name, toggles,
+                          resolve_revision(revision), keys)
+
+
+def format_bundle(uploads, toggles):
+    '''Format validated project uploads of several reports together'''
+    reports = OrderedDict()
+    for report, files in uploads.items():
+        reports[report] = ([upload.name for upload in files], files)
+    names = [''.join([report, '/', name])
+             for report, files in reports.items() for name in files[0]]
+    files = [upload for files in reports.values() for upload in files[1]]
+
+    # Skip formatting of previously formatted files
+    with stage('hash'):
+        key = cache_key('bundle', [series_key(name, upload)
+                                   for name, upload in zip(names, files)],
+                        toggles)
+    response = result_cache.get(key)
+    if response:
+        close_uploads(files)
+        return format_response(response)
+
+    folder_name = create_folder_name()
+    archive = archive_csv_files('bundle', folder_name, names, files)
+    return run_formatting(key, files, archive, run_bundle_job, reports,
+                          folder_name, toggles)
+
+
+def run_formatting(key, uploads, archive, func, *args):
+    '''Run formatting job in the request or on the worker pool'''
+    if app.config['JOB_MODE'] == 'sync':
+        try:
+            response = func(*args)
+        finally:
+            release_uploads(uploads, [archive])
+        if response:
+            result_cache.set(key, response)
+        return format_response(response)
+
+    job_id = submit_job(app.config['JOB_MODE'], func, *args)
+    job = get_job(job_id)
+    job.add_done_callback(partial(cache_result, key))
+    release_uploads(uploads, [archive, job])
+    return redirect(url_for('job_status', job_id=job_id))
+
+
+def cache_result(key, job):
+    '''Cache xlsx key of finished job'''
+    if not job.cancelled() and job.exception() is None and job.result():
+        result_cache.set(key, job.result())
+
+
+def format_response(response):
+    '''Redirect to formatted xlsx file or back to upload form'''
+    if not response:
+        flash(format_error, 'danger')
+        return redirect(url_for('index'))
+    else:
+        return redirect(url_for('download', s3_key_xlsx=response))
+
+
+@app.before_request
+def start_request_timer():
+    start_timer()
+
+
+@app.after_request
+def add_server_timing(response):
+    timer = finish_timer()
+    if timer is not None and timer.stages:
+        response.headers['Server-Timing'] = timer.header()
+    return response
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -26,152 +228,218 @@ def index():
 
     if form.validate_on_submit():
         if form.design_submit.data:
-            form_validation = form_validate(form.design_files.data, 21)
-            if form_validation == 'validated':
-                design_files = form.design_files.data
-                design_names = [secure_filename(file.filename)
-                                for file in design_files]
-                folder_name = create_folder_name()
-                s3_keys_csv = []
-                for i, file in enumerate(design_files):
-                    file.seek(0)
-                    s3_key_csv = ''.join(['design', '/', folder_name, '/',
-                                          'csv', '/', design_names[i]])
-                    s3.put_object(Bucket=S3_BUCKET, Key=s3_key_csv, Body=file)
-                    s3_keys_csv.append(s3_key_csv)
+            design_uploads, errors = form_validate(form.design_files.data, 21,
+                                                   upload_limit('design'))
+            if not errors:
                 hgl_toggle = (form.design_hgl_toggle.data)
-                response = design_format(s3, S3_BUCKET, s3_keys_csv,
-                                         folder_name, design_names,
-                                         hgl_toggle)
-                if not response:
-                    flash(format_error, 'danger')
-                    return redirect(url_for('index'))
-                else:
-                    return redirect(url_for('download',
-                                            s3_key_xlsx=response))
+                network_toggle = (form.design_network_toggle.data)
+                checks_toggle = (form.design_checks_toggle.data)
+                return format_uploads('design', design_uploads,
+                                      {'hgl': hgl_toggle,
+                                       'network': network_toggle,
+                                       'checks': checks_toggle},
+                                      form.design_revision.data)
             else:
-                flash(form_validation, 'danger')
+                flash_errors(errors)
                 return redirect(url_for('index'))
 
         if form.velocity_submit.data:
-            form_validation = form_validate(form.velocity_files.data, 13)
-            if form_validation == 'validated':
-                velocity_files = form.velocity_files.data
-                velocity_names = [secure_filename(file.filename)
-                                  for file in velocity_files]
-                folder_name = create_folder_name()
-                s3_keys_csv = []
-                for i, file in enumerate(velocity_files):
-                    file.seek(0)
-                    s3_key_csv = ''.join(['velocity', '/', folder_name, '/',
-                                          'csv', '/', velocity_names[i]])
-                    s3.put_object(Bucket=S3_BUCKET, Key=s3_key_csv, Body=file)
-                    s3_keys_csv.append(s3_key_csv)
+            velocity_uploads, errors = form_validate(
+                form.velocity_files.data, 13, upload_limit('velocity'))
+            if not errors:
                 fps_toggle = (form.velocity_fps_toggle.data)
-                response = velocity_format(s3, S3_BUCKET, s3_keys_csv,
-                                           folder_name, velocity_names,
-                                           fps_toggle)
-                if not response:
-                    flash(format_error, 'danger')
-                    return redirect(url_for('index'))
-                else:
-                    return redirect(url_for('download',
-                                            s3_key_xlsx=response))
+                checks_toggle = (form.velocity_checks_toggle.data)
+                return format_uploads('velocity', velocity_uploads,
+                                      {'fps': fps_toggle,
+                                       'checks': checks_toggle},
+                                      form.velocity_revision.data)
             else:
-                flash(form_validation, 'danger')
+                flash_errors(errors)
                 return redirect(url_for('index'))
 
         if form.spread_submit.data:
-            form_validation = form_validate(form.spread_files.data, 14)
-            if form_validation == 'validated':
-                spread_files = form.spread_files.data
-                spread_names = [secure_filename(file.filename)
-                                for file in spread_files]
-                folder_name = create_folder_name()
-                s3_keys_csv = []
-                for i, file in enumerate(spread_files):
-                    file.seek(0)
-                    s3_key_csv = ''.join(['spread', '/', folder_name, '/',
-                                          'csv', '/', spread_names[i]])
-                    s3.put_object(Bucket=S3_BUCKET, Key=s3_key_csv, Body=file)
-                    s3_keys_csv.append(s3_key_csv)
+            spread_uploads, errors = form_validate(
+                form.spread_files.data, 14, upload_limit('spread'))
+            if not errors:
                 bypass_toggle = (form.spread_bypass_toggle.data)
-                response = spread_format(s3, S3_BUCKET, s3_keys_csv,
-                                         folder_name, spread_names,
-                                         bypass_toggle)
-                if not response:
-                    flash(format_error, 'danger')
-                    return redirect(url_for('index'))
-                else:
-                    return redirect(url_for('download',
-                                            s3_key_xlsx=response))
+                return format_uploads('spread', spread_uploads,
+                                      {'bypass': bypass_toggle},
+                                      form.spread_revision.data)
+            else:
+                flash_errors(errors)
+                return redirect(url_for('index'))
+
+        if form.bundle_submit.data:
+            bundle_uploads, errors = bundle_validate(
+                form.bundle_files.data, upload_limit('bundle'))
+            if not errors:
+                toggles = {'hgl': form.bundle_hgl_toggle.data,
+                           'network': form.bundle_network_toggle.data,
+                           'checks': form.bundle_checks_toggle.data,
+                           'summary': form.bundle_summary_toggle.data,
+                           'fps': form.bundle_fps_toggle.data,
+                           'bypass': form.bundle_bypass_toggle.data}
+                return format_bundle(bundle_uploads, toggles)
             else:
-                flash(form_validation, 'danger')
+                flash_errors(errors)
                 return redirect(url_for('index'))
 
     return render_template('index.html', form=form)
 
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    if not job.done():
+        title = 'Formatting Files'
+        return render_template('job.html', title=title, job_id=job_id)
+    error = job.exception()
+    if error is not None:
+        if isinstance(error, NetworkError):
+            return network_error(error)
+        raise error
+    return format_response(job.result())
+
+
+@app.route('/metrics')
+def metrics():
+    cache_stats = result_cache.stats()
+    values = [
+        ('app_startup_seconds', 'gauge', 'Import time of the application.',
+         app.config['STARTUP_TIME']),
+        ('result_cache_size', 'gauge', 'Cached formatting results.',
+         cache_stats['size']),
+        ('result_cache_hits_total', 'counter', 'Result cache hits.',
+         cache_stats['hits']),
+        ('result_cache_misses_total', 'counter', 'Result cache misses.',
+         cache_stats['misses']),
+        ('result_cache_evictions_total', 'counter',
+         'Result cache evictions.', cache_stats['evictions'])]
+    return Response(render_metrics(values),
+                    content_type='text/plain; version=0.0.4')
+
+
+@app.route('/api/<report>', methods=['POST'])
+def api_report(report):
+    '''Stream normalized rows of uploaded report files as NDJSON'''
+    if report not in report_columns:
+        return jsonify(errors=['Report type not found!']), 404
+    data_format = request.values.get('format', 'rows')
+    if data_format not in ('rows', 'columns'):
+        return jsonify(errors=['Format must be rows or columns!']), 400
+    uploads, errors = form_validate(request.files.getlist('files'),
+                                    report_columns[report],
+                                    upload_limit(report))
+    if errors:
+        return jsonify(errors=error_messages(errors)), 400
+    if not uploads:
+        return jsonify(errors=[empty_error]), 400
+
+    # Rows are parsed while streaming, without workbooks or storage
+    from records import stream_records
+    spec = get_spec(report)
+    toggles = {name: request.values.get(name, '').lower() in
+               ('1', 'true', 'yes', 'on') for name in spec.toggles}
+    return Response(stream_records(spec, uploads, toggles,
+                                   data_format == 'columns'),
+                    mimetype='application/x-ndjson')
+
+
+def stream_file(key, cache_control):
+    '''Stream stored file in chunks, answering revalidations with 304'''
+    storage = get_storage()
+    try:
+        etag, size = storage.stat(key)
+    except KeyError:
+        abort(404)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            stream = storage.open(key)
+        except KeyError:
+            abort(404)
+        filename = os.path.basename(key)
+        mimetype = (mimetypes.guess_type(filename)[0] or
+                    'application/octet-stream')
+        response = Response(wrap_file(request.environ, stream,
+                                      COPY_CHUNK_SIZE),
+                            mimetype=mimetype, direct_passthrough=True)
+        response.content_length = size
+        response.headers.add('Content-Disposition', 'attachment',
+                             filename=filename)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def send_stored(key, cache_control):
+    '''Stream stored file or redirect to its storage url'''
+    if app.config['DOWNLOAD_MODE'] == 'stream':
+        return stream_file(key, cache_control)
+    return redirect(get_storage().url(key), code=302)
+
+
 @app.route('/download/<path:s3_key_xlsx>')
 def download(s3_key_xlsx):
-    url = s3.generate_presigned_url(
-        'get_object',
-        Params={'Bucket': S3_BUCKET,
-                'Key': s3_key_xlsx},
-        ExpiresIn=100
-    )
-    return redirect(url, code=302)
+    return send_stored(s3_key_xlsx, download_cache)
 
 
 @app.route('/design_report')
 def design_report():
-    url = s3.generate_presigned_url(
-        'get_object',
-        Params={'Bucket': S3_BUCKET,
-                'Key': 'static/design.rpt'},
-        ExpiresIn=100
-    )
-    return redirect(url, code=302)
+    return send_stored('static/design.rpt', template_cache)
 
 
 @app.route('/velocity_report')
 def velocity_report():
-    url = s3.generate_presigned_url(
-        'get_object',
-        Params={'Bucket': S3_BUCKET,
-                'Key': 'static/velocity.rpt'},
-        ExpiresIn=100
-    )
-    return redirect(url, code=302)
+    return send_stored('static/velocity.rpt', template_cache)
 
 
 @app.route('/spread_report')
 def spread_report():
-    url = s3.generate_presigned_url(
-        'get_object',
-        Params={'Bucket': S3_BUCKET,
-                'Key': 'static/spread.rpt'},
-        ExpiresIn=100
-    )
-    return redirect(url, code=302)
+    return send_stored('static/spread.rpt', template_cache)
+
+
+@app.route('/files/<path:key>')
+def files(key):
+    if not get_storage().served:
+        abort(404)
+    if key.startswith('static/'):
+        return stream_file(key, template_cache)
+    return stream_file(key, download_cache)
 
 
 @app.errorhandler(404)
 def page_not_found(error):
     title = 'Page Not Found'
-    return render_template('404.html', title=title)
+    return render_template('404.html', title=title), 404
 
 
 @app.errorhandler(413)
 def files_too_large(error):
     title = 'Files Too Large'
-    return render_template('413.html', title=title)
+    return render_template('413.html', title=title), 413
+
+
+@app.errorhandler(NetworkError)
+def network_error(error):
+    flash(str(error), 'danger')
+    return redirect(url_for('index'))
 
 
 @app.errorhandler(500)
 def internal_error(error):
     title = 'Internal Server Error'
-    return render_template('500.html', title=title)
+    return render_template('500.html', title=title), 500
+
+
+# Import report modules off the request path once the app is loaded
+if app.config['WARM_UP']:
+    archive_pool.submit(warm_up)
+
+app.config['STARTUP_TIME'] = time.time() - start_time
 
 
 if __name__ == '__main__':
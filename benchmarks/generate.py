@@ -0,0 +1,144 @@
+import argparse
+import os
+import random
+
+design_header = ['Line No.', 'Inlet Type', 'Line ID', 'Dnstr Line No.',
+                 'Drng Area (ac)', 'Inlet Time (min)', 'Rain (I) (in/hr)',
+                 'Runoff Coeff (C)', 'Flow Rate Inlet (cfs)',
+                 'Flow Rate Total (cfs)', 'Capac Full (cfs)',
+                 'Line Length (ft)', 'Line Size (in)', 'n-val Pipe',
+                 'Line Slope (%)', 'Invert Up (ft)', 'Invert Dn (ft)',
+                 'Gnd / Rim El Up (ft)', 'Gnd / Rim El Dn (ft)',
+                 'HGL Up (ft)', 'HGL Dn (ft)']
+velocity_header = ['Line No.', 'Inlet Type', 'Line ID', 'Dnstr Line No.',
+                   'Total Area (ac)', 'Inlet Time (min)', 'Rain (I) (in/hr)',
+                   'Flow Rate Total (cfs)', 'Vel Ave (ft/s)',
+                   'Line Length (ft)', 'Line Size (in)', 'n-val Pipe',
+                   'Line Slope (%)']
+spread_header = ['Line No.', 'Inlet ID', 'Inlet Type', 'Byp Line No.',
+                 'Drng Area (ac)', 'Inlet Time (min)', 'Rain (I) (in/hr)',
+                 'Runoff Coeff (C)', 'Q Inlet (cfs)', 'Q Carry (cfs)',
+                 'Q Capt (cfs)', 'Q Byp (cfs)', 'Gutter Slope (ft/ft)',
+                 'Spread (ft)']
+
+inlet_types = ['Curb', 'Grate', 'Comb.', 'Generic', 'None', 'Dp-Curb',
+               'Dp-Grate', 'Null Structure']
+pipe_sizes = [15, 18, 24, 30, 36, 42, 48]
+
+
+def downstream_lines(n, rnd, outfalls=50):
+    '''Return downstream line of each line, 0 for outfalls
+
+    Lines are numbered from their outfall upstream, so every line drains
+    to a lower numbered line of the same system.'''
+    downstream = [0] * (n + 1)
+    start = 1
+    for line in range(1, n + 1):
+        if line == 1 or rnd.random() < 1.0 / outfalls:
+            start = line
+        else:
+            downstream[line] = rnd.randint(max(start, line - 5), line - 1)
+    return downstream
+
+
+def decimal(rnd, low, high, digits=2):
+    '''Return random value formatted with fixed decimals'''
+    return '{:.{}f}'.format(rnd.uniform(low, high), digits)
+
+
+def design_export(n, seed=0):
+    '''Return tab separated pipe design export of n lines'''
+    rnd = random.Random(seed)
+    downstream = downstream_lines(n, rnd)
+    rows = ['\t'.join(design_header)]
+    for line in range(1, n + 1):
+        outfall = downstream[line] == 0
+        size = str(rnd.choice(pipe_sizes))
+        if line % 11 == 0:
+            size += ' DOUBLE'
+        slope = decimal(rnd, 0.3, 4.0)
+        if line % 13 == 0:
+            slope = ''.join(['(', slope, ')'])
+        hgl_up = decimal(rnd, 90, 100)
+        if line % 7 == 0:
+            hgl_up += ' j'
+        rows.append('\t'.join(
+            [str(line), 'Hdwall' if outfall else rnd.choice(inlet_types),
+             ''.join(['S-', str(line)]),
+             'Outfall' if outfall else str(downstream[line]),
+             decimal(rnd, 0, 5), decimal(rnd, 5, 30, 1), decimal(rnd, 2, 8),
+             decimal(rnd, 0.2, 0.95), decimal(rnd, 0, 20),
+             decimal(rnd, 0, 80), decimal(rnd, 5, 120),
+             decimal(rnd, 10, 400, 3), size, '0.013', slope,
+             decimal(rnd, 80, 95), decimal(rnd, 80, 95),
+             decimal(rnd, 95, 110), decimal(rnd, 95, 110), hgl_up,
+             decimal(rnd, 90, 100)]))
+    rows.append('Notes:  j-Line contains hyd. jump.')
+    return '\n'.join(rows).encode('UTF-8')
+
+
+def velocity_export(n, seed=0):
+    '''Return tab separated pipe velocity export of n lines'''
+    rnd = random.Random(seed)
+    downstream = downstream_lines(n, rnd)
+    rows = ['\t'.join(velocity_header)]
+    for line in range(1, n + 1):
+        outfall = downstream[line] == 0
+        rows.append('\t'.join(
+            [str(line), 'Hdwall' if outfall else rnd.choice(inlet_types),
+             ''.join(['S-', str(line)]),
+             'Outfall' if outfall else str(downstream[line]),
+             decimal(rnd, 0, 50), decimal(rnd, 5, 30, 1), decimal(rnd, 2, 8),
+             decimal(rnd, 0, 80), decimal(rnd, 1, 15),
+             decimal(rnd, 10, 400, 3), str(rnd.choice(pipe_sizes)), '0.013',
+             decimal(rnd, 0.3, 4.0)]))
+    return '\n'.join(rows).encode('UTF-8')
+
+
+def spread_export(n, seed=0):
+    '''Return tab separated gutter spread export of n inlets'''
+    rnd = random.Random(seed)
+    downstream = downstream_lines(n, rnd)
+    rows = ['\t'.join(spread_header)]
+    for line in range(1, n + 1):
+        if downstream[line] == 0:
+            bypass = rnd.choice(['Sag', 'Offsite'])
+        else:
+            bypass = ''.join(['S-', str(downstream[line])])
+        rows.append('\t'.join(
+            [str(line), ''.join(['S-', str(line)]),
+             rnd.choice(inlet_types[:4] + ['Dp-Curb']), bypass,
+             decimal(rnd, 0, 2), decimal(rnd, 5, 30, 1), decimal(rnd, 2, 8),
+             decimal(rnd, 0.2, 0.95), decimal(rnd, 0, 10),
+             decimal(rnd, 0, 5), decimal(rnd, 0, 10), decimal(rnd, 0, 5),
+             decimal(rnd, 0.005, 0.05, 3), decimal(rnd, 1, 12)]))
+    return '\n'.join(rows).encode('UTF-8')
+
+
+exports = {'design': design_export,
+           'velocity': velocity_export,
+           'spread': spread_export}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write synthetic Hydraflow exports.')
+    parser.add_argument('output', help='output directory')
+    parser.add_argument('--lines', type=int, default=1000,
+                        help='number of lines of each export')
+    parser.add_argument('--series', type=int, default=1,
+                        help='number of exports of each report')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    for report, export in exports.items():
+        for series in range(args.series):
+            filename = ''.join([report.title(), '_', str(series + 1),
+                                '.txt'])
+            with open(os.path.join(args.output, filename), 'wb') as stream:
+                stream.write(export(args.lines, args.seed + series))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook  # noqa: E402
+from generate import exports  # noqa: E402
+from jobs import get_spec  # noqa: E402
+from reports import parse_report, normalize_report, series_name  # noqa: E402
+from workbook import Sheet, write_sheet  # noqa: E402
+
+stages = ['parse', 'normalize', 'build', 'style', 'save']
+default_sizes = [100, 1000, 10000, 100000]
+default_toggles = {'hgl': True, 'network': True, 'fps': True,
+                   'bypass': True}
+
+
+def run_stages(spec, data, toggles):
+    '''Format one export, returning seconds spent in each stage'''
+    times = []
+    start = time.perf_counter()
+
+    def lap():
+        nonlocal start
+        now = time.perf_counter()
+        times.append(now - start)
+        start = now
+
+    df = parse_report(spec, io.BytesIO(data))
+    lap()
+    df = normalize_report(spec, df)
+    lap()
+    layout = spec.layout(toggles)
+    name = series_name('Benchmark.txt')
+    sheet = Sheet(name, name + spec.suffix, df[layout.columns].values.tolist(),
+                  layout)
+    lap()
+    wb = Workbook(write_only=True)
+    write_sheet(wb, sheet)
+    lap()
+    wb.save(io.BytesIO())
+    lap()
+    return times
+
+
+def peak_memory(spec, data, toggles):
+    '''Return peak traced memory of formatting one export in bytes'''
+    tracemalloc.start()
+    try:
+        run_stages(spec, data, toggles)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(report, size, repeat, toggles):
+    '''Return best stage times and peak memory of report at size'''
+    spec = get_spec(report)
+    data = exports[report](size)
+    runs = [run_stages(spec, data, toggles) for _ in range(repeat)]
+    best = [min(times) for times in zip(*runs)]
+
+    # Memory is traced in a separate run to keep tracing out of the timings
+    return best, peak_memory(spec, data, toggles)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time each formatting stage of synthetic exports.')
+    parser.add_argument('--reports', nargs='+', default=list(exports),
+                        choices=list(exports))
+    parser.add_argument('--sizes', nargs='+', type=int, default=default_sizes)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs of each size, best run is shown')
+    args = parser.parse_args()
+
+    columns = ['report', 'rows'] + stages + ['total', 'peak MB']
+    print(''.join(['{:>10}'.format(column) for column in columns]))
+    for report in args.reports:
+        for size in args.sizes:
+            repeat = args.repeat if size < 100000 else 1
+            times, peak = benchmark(report, size, repeat, default_toggles)
+            values = (['{:>10}'.format(report), '{:>10}'.format(size)] +
+                      ['{:>10.3f}'.format(value) for value in times] +
+                      ['{:>10.3f}'.format(sum(times)),
+                       '{:>10.1f}'.format(peak / 1024 / 1024)])
+            print(''.join(values))
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import time
+
+
+def cache_key(report, keys, toggles):
+    '''Hash report type, series keys of the files and toggle values
+
+    Series keys hash the name and contents of each file, so uploads are
+    read once for the result cache and for revisions.'''
+    digest = hashlib.sha256()
+    digest.update(report.encode('UTF-8'))
+    for name, value in sorted(toggles.items()):
+        digest.update(''.join(['\0', name, '=', str(bool(value))])
+                      .encode('UTF-8'))
+    for key in keys:
+        digest.update(''.join(['\0', key]).encode('UTF-8'))
+    return digest.hexdigest()
+
+
+class ResultCache():
+    '''Least recently used cache of results with a time to live'''
+
+    def __init__(self, max_size=256, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        '''Return cached value, None if missing or expired'''
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.time():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        '''Add value to cache, evicting least recently used values'''
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.time() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        '''Return cache size and counters'''
+        return {'size': len(self._items), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,90 @@
+import numpy as np
+from reports import Column, ReportSpec
+from utils import get_env
+
+# Self-cleansing and scour velocity limits in ft/s
+MIN_VELOCITY = float(get_env('CHECK_MIN_VELOCITY', 2.0))
+MAX_VELOCITY = float(get_env('CHECK_MAX_VELOCITY', 15.0))
+
+violations_spec = ReportSpec(
+    name='violations',
+    filename=None,
+    suffix='',
+    csv_columns=[],
+    columns=[
+        Column('series', 'SERIES'),
+        Column('struc_from', 'STRUCTURE', 'FROM'),
+        Column('struc_to', None, 'TO'),
+        Column('check', 'CHECK'),
+        Column('value', 'VALUE', None, '0.00'),
+        Column('limit', 'LIMIT', None, '0.00')],
+    col_dims={'A': 4.02, 'B': 17.24, 'C': 10.02, 'D': 10.02, 'E': 17.24,
+              'F': 11.47, 'G': 11.47},
+    row_dims={1: 13.8, 2: 18, 3: 21, 4: 21},
+    merges=['C3:D3'])
+
+
+def manning_capacity(size, n_value, slope, barrels=1):
+    '''Return full flow capacity in cfs and velocity in ft/s of round pipes
+
+    Uses Manning's equation with pipe size in inches and slope in
+    percent. Pipes without a positive slope have no capacity.'''
+    diameter = size / 12.0
+    area = np.pi * diameter ** 2 / 4.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        velocity = (1.486 / n_value * (diameter / 4.0) ** (2.0 / 3.0) *
+                    np.sqrt(np.clip(slope, 0, None) / 100.0))
+    return velocity * area * barrels, velocity
+
+
+class PipeChecks():
+    '''Hydraulic checks of pipe rows with a violations sheet layout'''
+
+    def __init__(self, flow, velocity=None):
+        self.flow = flow
+        self.velocity = velocity
+        self.spec = violations_spec
+
+    def rows(self, df, series):
+        '''Return violation rows of series dataframe in pipe order'''
+        slope = df['slope'].values
+        flow = df[self.flow].values
+        capacity, velocity = manning_capacity(
+            df['size'].values, df['n_value'].values, slope,
+            df['barrels'].values)
+        if self.velocity:
+            velocity = df[self.velocity].values
+        sloped = slope > 0
+
+        # Check name, failing rows, values and limits of each check
+        checks = [
+            ('SURCHARGED', sloped & (flow > capacity), flow, capacity),
+            ('LOW VELOCITY', sloped & (velocity < MIN_VELOCITY), velocity,
+             MIN_VELOCITY),
+            ('HIGH VELOCITY', sloped & (velocity > MAX_VELOCITY), velocity,
+             MAX_VELOCITY),
+            ('ADVERSE SLOPE', slope <= 0, slope, 0.0)]
+        positions = []
+        names = []
+        values = []
+        limits = []
+        for name, failed, value, limit in checks:
+            failed = np.flatnonzero(failed)
+            positions.append(failed)
+            names.append(np.full(len(failed), name, dtype=object))
+            values.append(value[failed])
+            limits.append(np.broadcast_to(limit, len(value))[failed])
+
+        order = np.argsort(np.concatenate(positions), kind='mergesort')
+        positions = np.concatenate(positions)[order]
+        return list(zip(
+            [series] * len(positions),
+            df['struc_from'].values[positions].tolist(),
+            df['struc_to'].values[positions].tolist(),
+            np.concatenate(names)[order].tolist(),
+            np.concatenate(values)[order].tolist(),
+            np.concatenate(limits)[order].tolist()))
+
+
+design_checks = PipeChecks('flow_total')
+velocity_checks = PipeChecks('flow', 'velocity')
@@ -0,0 +1,145 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from utils import report_columns, header_columns
+from network import NetworkError
+import argparse
+import os
+import sys
+import time
+import reports
+from jobs import get_spec
+from tables import StoredTable
+
+
+def find_exports(root, report=None):
+    '''Group Hydraflow txt files of each directory by report type'''
+    groups = OrderedDict()
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        for filename in sorted(files):
+            if not filename.lower().endswith('.txt'):
+                continue
+            path = os.path.join(folder, filename)
+            with open(path, 'rb') as stream:
+                columns = header_columns(stream.readline())
+            for name, csv_columns in report_columns.items():
+                if columns == csv_columns and report in (None, name):
+                    groups.setdefault((folder, name), []).append(path)
+    return groups
+
+
+def init_worker():
+    '''Read series files in the worker process itself'''
+    reports.RENDER_WORKERS = 1
+
+
+def table_path(path):
+    '''Return path of the table stored next to a txt file'''
+    return os.path.splitext(path)[0] + '.npz'
+
+
+def open_export(path):
+    '''Open txt file, or its table if not older than the txt file'''
+    table = table_path(path)
+    if (os.path.exists(table) and
+            os.path.getmtime(table) >= os.path.getmtime(path)):
+        with open(table, 'rb') as stream:
+            return StoredTable(stream.read())
+    return open(path, 'rb')
+
+
+def convert(report, paths, output, toggles, store_tables=False):
+    '''Render txt files of one report to a local xlsx file
+
+    Series are loaded from tables next to their txt files when present,
+    and tables of parsed txt files are written if requested.'''
+    start = time.time()
+    spec = get_spec(report)
+    names = [os.path.basename(path) for path in paths]
+    files = [open_export(path) for path in paths]
+    tables = [] if store_tables else None
+    try:
+        xlsx_form = reports.render_report(spec, files, names, toggles,
+                                          tables=tables)
+    except NetworkError as error:
+        return output, None, str(error), time.time() - start
+    finally:
+        for file in files:
+            if hasattr(file, 'close'):
+                file.close()
+    if xlsx_form is None:
+        return output, None, 'File format not supported!', time.time() - start
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'wb') as stream:
+        stream.write(xlsx_form)
+    for path, file, data in zip(paths, files, tables or []):
+        if not hasattr(file, 'load'):
+            with open(table_path(path), 'wb') as stream:
+                stream.write(data)
+    return output, len(xlsx_form), None, time.time() - start
+
+
+def parse_args(argv=None):
+    '''Parse command line arguments'''
+    parser = argparse.ArgumentParser(
+        description='Convert directories of Hydraflow csv files into '
+                    'formatted xlsx files.')
+    parser.add_argument('input', help='directory of Hydraflow txt files')
+    parser.add_argument('output', nargs='?',
+                        help='output directory, defaults to input directory')
+    parser.add_argument('--report', choices=list(report_columns),
+                        help='only convert files of one report type')
+    parser.add_argument('--hgl', action='store_true',
+                        help='include hydraulic grade line columns')
+    parser.add_argument('--network', action='store_true',
+                        help='include upstream network total columns')
+    parser.add_argument('--checks', action='store_true',
+                        help='add sheet of hydraulic check violations')
+    parser.add_argument('--fps', action='store_true',
+                        help='highlight pipe velocity column')
+    parser.add_argument('--bypass', action='store_true',
+                        help='include bypass columns')
+    parser.add_argument('--tables', action='store_true',
+                        help='store parsed tables next to the txt files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = args.output or args.input
+    toggles = {'hgl': args.hgl, 'network': args.network,
+               'checks': args.checks, 'fps': args.fps, 'bypass': args.bypass}
+    groups = find_exports(args.input, args.report)
+    if not groups:
+        print('No Hydraflow files found in ' + args.input)
+        return 1
+
+    # Convert each directory and report type on the process pool
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1),
+                             initializer=init_worker) as pool:
+        futures = []
+        for (folder, report), paths in groups.items():
+            relative = os.path.relpath(folder, args.input)
+            path = os.path.normpath(os.path.join(
+                output, relative, get_spec(report).filename))
+            futures.append(pool.submit(convert, report, paths, path, toggles,
+                                       args.tables))
+        results = [future.result() for future in futures]
+
+    # Print timing summary
+    failed = 0
+    for path, size, error, seconds in results:
+        status = error if error else ''.join([str(size), ' bytes'])
+        print(''.join(['{:8.2f}'.format(seconds), 's  ', path, '  ', status]))
+        failed += error is not None
+    print(''.join([str(len(results) - failed), ' converted, ', str(failed),
+                   ' failed in ', '{:.2f}'.format(time.time() - start), 's']))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,36 @@
 from flask_wtf import FlaskForm
-from wtforms.fields import MultipleFileField, BooleanField, SubmitField
+from wtforms.fields import (MultipleFileField, BooleanField, StringField,
+                            SubmitField)
 
 
 class NetworkUpload(FlaskForm):
     design_files = MultipleFileField('Upload Pipe Design Files',
                                      id='design_input')
     design_hgl_toggle = BooleanField('Display HGL Elevations')
+    design_network_toggle = BooleanField('Display Upstream Totals')
+    design_checks_toggle = BooleanField('Check Pipe Hydraulics')
+    design_revision = StringField('Previous Job ID')
     design_submit = SubmitField('Format Pipe Design Files')
 
     velocity_files = MultipleFileField('Upload Pipe Velocity Files',
                                        id='velocity_input')
     velocity_fps_toggle = BooleanField('Highlight Velocities')
+    velocity_checks_toggle = BooleanField('Check Pipe Hydraulics')
+    velocity_revision = StringField('Previous Job ID')
     velocity_submit = SubmitField('Format Pipe Velocity Files')
 
     spread_files = MultipleFileField('Upload Gutter Spread Files',
                                      id='spread_input')
     spread_bypass_toggle = BooleanField('Display Bypass Data')
+    spread_revision = StringField('Previous Job ID')
     spread_submit = SubmitField('Format Gutter Spread Files')
+
+    bundle_files = MultipleFileField('Upload Project Files',
+                                     id='bundle_input')
+    bundle_hgl_toggle = BooleanField('Display HGL Elevations')
+    bundle_network_toggle = BooleanField('Display Upstream Totals')
+    bundle_checks_toggle = BooleanField('Check Pipe Hydraulics')
+    bundle_summary_toggle = BooleanField('Add Structure Summary')
+    bundle_fps_toggle = BooleanField('Highlight Velocities')
+    bundle_bypass_toggle = BooleanField('Display Bypass Data')
+    bundle_submit = SubmitField('Format Project Files')
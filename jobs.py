@@ -0,0 +1,161 @@
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from collections import OrderedDict
+from functools import partial
+from threading import Lock
+from utils import get_env, process_context
+from storage import get_storage, S3Storage
+from transfer import get_client
+from metrics import timed, start_timer, finish_timer
+import io
+import uuid
+import zipfile
+
+JOB_WORKERS = int(get_env('JOB_WORKERS', 2))
+MAX_JOBS = int(get_env('MAX_JOBS', 1000))
+
+report_specs = {}
+
+_pool = None
+_pool_lock = Lock()
+_jobs = OrderedDict()
+
+
+def get_spec(report):
+    '''Return report spec, importing pandas and openpyxl on first use'''
+    if not report_specs:
+        from pipe_design import design_spec
+        from pipe_velocity import velocity_spec
+        from gutter_spread import spread_spec
+        report_specs.update(design=design_spec, velocity=velocity_spec,
+                            spread=spread_spec)
+    return report_specs[report]
+
+
+def warm_up():
+    '''Import report modules and create the storage client before first use'''
+    get_spec('design')
+    if isinstance(get_storage(), S3Storage):
+        get_client()
+
+
+def run_job(report, uploads, names, folder_name, toggles, revision=None,
+            keys=None):
+    '''Format report uploads and write the xlsx file to storage'''
+    from reports import format_report
+    with timed(report):
+        return format_report(get_spec(report), get_storage(), uploads,
+                             folder_name, names, toggles, revision, keys)
+
+
+def run_bundle_job(reports, folder_name, toggles):
+    '''Format project files of several reports into one zip archive'''
+    with timed('bundle'):
+        return write_bundle(reports, folder_name, toggles)
+
+
+def write_bundle(reports, folder_name, toggles):
+    '''Render reports into a zip archive and write it to storage'''
+    from reports import render_report
+    from summary import summary_spec, render_summary
+    summary = toggles.get('summary')
+    frames = OrderedDict()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+        for report, (names, uploads) in reports.items():
+            spec = get_spec(report)
+            series_frames = [] if summary else None
+            xlsx_form = render_report(spec, uploads, names, toggles,
+                                      series_frames)
+            if xlsx_form is None:
+                return None
+            zf.writestr(spec.filename, xlsx_form)
+            if summary:
+                frames[report] = series_frames
+
+        # Add summary of structures joined across reports
+        if frames:
+            zf.writestr(summary_spec.filename, render_summary(frames))
+
+    # Write zip archive to storage
+    s3_key_zip = ''.join(['bundle', '/', folder_name, '/',
+                          'xlsx', '/', 'Project Reports.zip'])
+    get_storage().put(s3_key_zip, archive.getvalue())
+    return s3_key_zip
+
+
+def process_job(func, *args):
+    '''Run job in a worker process, returning its result and stage timer'''
+    start_timer()
+    try:
+        result = func(*args)
+    finally:
+        timer = finish_timer(observe=False)
+    return result, timer
+
+
+def finish_job(job, future):
+    '''Observe stage durations of a process job and pass on its result'''
+    if future.cancelled():
+        job.cancel()
+        return
+    if not job.set_running_or_notify_cancel():
+        return
+    error = future.exception()
+    if error is not None:
+        job.set_exception(error)
+        return
+    result, timer = future.result()
+    if timer.report:
+        timer.observe()
+    job.set_result(result)
+
+
+def init_worker():
+    '''Render series in the job process itself, jobs share the cores'''
+    import reports
+    reports.RENDER_WORKERS = 1
+
+
+def get_pool(mode):
+    '''Return shared worker pool for job mode
+
+    Process jobs fall back to threads for storage that other processes
+    cannot see, whose files would be lost with the worker.'''
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if mode == 'process' and get_storage().shared:
+                    _pool = ProcessPoolExecutor(
+                        max_workers=JOB_WORKERS,
+                        mp_context=process_context(),
+                        initializer=init_worker)
+                else:
+                    _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+    return _pool
+
+
+def submit_job(mode, func, *args):
+    '''Queue formatting job on the worker pool and return its id
+
+    Process jobs send their stage timer back with the result, so their
+    durations are observed by the histograms of this process.'''
+    job_id = uuid.uuid4().hex
+    pool = get_pool(mode)
+    if isinstance(pool, ProcessPoolExecutor):
+        future = Future()
+        pool.submit(process_job, func, *args).add_done_callback(
+            partial(finish_job, future))
+    else:
+        future = pool.submit(func, *args)
+    with _pool_lock:
+        _jobs[job_id] = future
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    return job_id
+
+
+def get_job(job_id):
+    '''Return future of queued job, None if unknown'''
+    return _jobs.get(job_id)
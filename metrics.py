@@ -0,0 +1,185 @@
+from contextlib import contextmanager
+from collections import OrderedDict
+from threading import Lock, local
+import time
+
+# Upper bounds of stage duration buckets in seconds
+duration_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                    30, 60)
+
+# Upper bounds of row count label values
+row_buckets = (100, 1000, 10000, 100000)
+
+_local = local()
+
+
+class Histogram():
+    '''Prometheus histogram of observations grouped by label values'''
+
+    def __init__(self, name, description, labels,
+                 buckets=duration_buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = OrderedDict()
+        self._lock = Lock()
+
+    def observe(self, values, value):
+        '''Add observation to the series of label values'''
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * len(self.buckets),
+                                                 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        '''Return histogram in Prometheus text format'''
+        lines = ['# HELP ' + self.name + ' ' + self.description,
+                 '# TYPE ' + self.name + ' histogram']
+        with self._lock:
+            for values, (counts, count, total) in self._series.items():
+                labels = ','.join(''.join([label, '="', value, '"'])
+                                  for label, value in zip(self.labels, values))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(''.join([
+                        self.name, '_bucket{', labels, ',le="', str(bound),
+                        '"} ', str(bucket_count)]))
+                lines.append(''.join([self.name, '_bucket{', labels,
+                                      ',le="+Inf"} ', str(count)]))
+                lines.append(''.join([self.name, '_sum{', labels, '} ',
+                                      repr(total)]))
+                lines.append(''.join([self.name, '_count{', labels, '} ',
+                                      str(count)]))
+        return lines
+
+
+stage_seconds = Histogram(
+    'formatting_stage_seconds', 'Duration of formatting stages.',
+    ('stage', 'report', 'rows'))
+
+
+class StageTimer():
+    '''Durations of the formatting stages of one request or job'''
+
+    def __init__(self, report=None):
+        self.report = report
+        self.rows = 0
+        self.start = time.time()
+        self.end = None
+        self.stages = OrderedDict()
+
+    def add(self, name, seconds):
+        '''Add duration to stage'''
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def stop(self):
+        '''Stop the total duration, which is otherwise still running'''
+        self.end = time.time()
+
+    def elapsed(self):
+        '''Return total duration in seconds'''
+        return (self.end or time.time()) - self.start
+
+    def header(self):
+        '''Return Server-Timing header value of stages in milliseconds'''
+        stages = list(self.stages.items())
+        stages.append(('total', self.elapsed()))
+        return ', '.join(''.join([name, ';dur=',
+                                  '{:.1f}'.format(seconds * 1000)])
+                         for name, seconds in stages)
+
+    def observe(self):
+        '''Add stage durations to histograms by report type and row count'''
+        rows = row_label(self.rows)
+        for name, seconds in self.stages.items():
+            stage_seconds.observe((name, self.report, rows), seconds)
+        stage_seconds.observe(('total', self.report, rows), self.elapsed())
+
+
+def row_label(rows):
+    '''Return row count bucket label'''
+    for bound in row_buckets:
+        if rows < bound:
+            return '<' + str(bound)
+    return '>=' + str(row_buckets[-1])
+
+
+def start_timer(report=None):
+    '''Start collecting stage durations in the current thread'''
+    _local.timer = StageTimer(report)
+    return _local.timer
+
+
+def finish_timer(observe=True):
+    '''Stop collecting stage durations, adding them to histograms if observed
+
+    Timers of worker processes are not observed, but returned to the
+    application process that renders the histograms.'''
+    timer = getattr(_local, 'timer', None)
+    _local.timer = None
+    if timer is not None:
+        timer.stop()
+        if observe and timer.report:
+            timer.observe()
+    return timer
+
+
+@contextmanager
+def timed(report):
+    '''Time stages of report formatting in the current or a new timer'''
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.report = report
+        yield timer
+        return
+    timer = start_timer(report)
+    try:
+        yield timer
+    finally:
+        finish_timer()
+
+
+@contextmanager
+def stage(name):
+    '''Time stage of the current timer, if any'''
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def add_stages(stages):
+    '''Add stage durations of a worker process to the current timer'''
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        for name, seconds in stages.items():
+            timer.add(name, seconds)
+
+
+def count_rows(rows):
+    '''Add formatted rows to the current timer'''
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.rows += rows
+
+
+def render_metrics(values=()):
+    '''Return histograms and name, type, description, value tuples as text'''
+    lines = stage_seconds.render()
+    for name, kind, description, value in values:
+        lines += ['# HELP ' + name + ' ' + description,
+                  '# TYPE ' + name + ' ' + kind,
+                  ' '.join([name, repr(value)])]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,53 @@
+import json
+import pandas as pd
+from network import NetworkError
+from reports import read_frame, series_name
+from utils import format_error, close_uploads
+from metrics import count_rows
+
+# Rows encoded at once when streaming NDJSON lines
+CHUNK_ROWS = 10000
+
+
+def json_lines(df):
+    '''Return dataframe rows as NDJSON text ending in a newline'''
+    text = df.to_json(orient='records', lines=True)
+    return text if text.endswith('\n') else text + '\n'
+
+
+def series_columns(series, df):
+    '''Return dataframe as a columnar JSON line of a series'''
+    columns = ','.join(''.join([json.dumps(name), ':',
+                                df[name].to_json(orient='records')])
+                       for name in df.columns)
+    return ''.join(['{"series":', json.dumps(series), ',"columns":{',
+                    columns, '}}\n'])
+
+
+def stream_records(spec, uploads, toggles, columnar=False):
+    '''Yield normalized report columns of uploads as NDJSON text
+
+    Each line is one row with its series name, or one series of column
+    arrays if columnar. Parsing errors end the stream with an error
+    line, and uploads are closed once the stream ends.'''
+    columns = spec.layout(toggles).columns
+    try:
+        for upload in uploads:
+            series = series_name(upload.name)
+            try:
+                df = read_frame(spec, upload, series)[columns]
+            except (pd.errors.ParserError, ValueError):
+                yield json.dumps({'error': format_error}) + '\n'
+                return
+            except NetworkError as error:
+                yield json.dumps({'error': str(error)}) + '\n'
+                return
+            count_rows(len(df))
+            if columnar:
+                yield series_columns(series, df)
+                continue
+            df.insert(0, 'series', series)
+            for start in range(0, len(df), CHUNK_ROWS):
+                yield json_lines(df.iloc[start:start + CHUNK_ROWS])
+    finally:
+        close_uploads(uploads)
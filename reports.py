@@ -0,0 +1,391 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from threading import Lock
+import io
+import os
+import re
+import pandas as pd
+from workbook import Sheet, StylePlan, write_workbook, highlight_fill
+from network import NetworkError, resolve_structures
+from openpyxl.utils import get_column_letter
+from utils import get_env, env_flag, process_context, series_name
+from metrics import stage, count_rows, start_timer, finish_timer, \
+    add_stages
+from tables import StoredTable, dump_table, table_key
+from revisions import series_key, load_revision, manifest_key, \
+    dump_manifest, splice_sheets, read_sheets
+
+
+inlet_types = {'Outfall': 'OUT', 'Curb': 'CURB', 'Grate': 'GRATE',
+               'Comb.': 'COMB', 'Generic': 'GENERIC', 'Hdwall': 'FES',
+               'None': 'NONE', 'Dp-Curb': 'DP-CURB', 'Dp-Grate': 'DP-GRATE',
+               'Null Structure': 'NONE'}
+
+RENDER_WORKERS = int(get_env('RENDER_WORKERS', os.cpu_count() or 1))
+
+# Store normalized series tables next to the csv files of each job
+STORE_TABLES = env_flag('STORE_TABLES', True)
+
+_render_pool = None
+_render_pool_lock = Lock()
+
+# Hydraulic jump, double pipe and parenthesis markers of numeric values
+markers = re.compile(r' j| DOUBLE|[()]')
+
+
+class Column():
+    '''Report table column with its header cells and number format'''
+
+    def __init__(self, name, header=None, units=None, number_format=None,
+                 toggle=None, fill_toggle=None, width=None):
+        self.name = name
+        self.header = header
+        self.units = units
+        self.number_format = number_format
+        self.toggle = toggle
+        self.fill_toggle = fill_toggle
+        self.width = width
+
+
+class Layout():
+    '''Compiled sheet layout of a report for one set of toggles'''
+
+    def __init__(self, spec, toggles):
+        columns = [column for column in spec.columns
+                   if not column.toggle or toggles.get(column.toggle)]
+        self.columns = [column.name for column in columns]
+        self.headers = [column.header for column in columns]
+        self.units = [column.units for column in columns]
+        self.col_dims = dict(spec.col_dims)
+        self.row_dims = spec.row_dims
+        self.max_col = len(columns) + 1
+        self.merges = [''.join(['B2:', get_column_letter(self.max_col), '2'])]
+        self.merges += list(spec.merges)
+
+        formats = {}
+        fills = {}
+        for col, column in enumerate(columns, 2):
+            if column.width:
+                self.col_dims[get_column_letter(col)] = column.width
+            if column.number_format:
+                formats[col] = column.number_format
+            if column.fill_toggle and toggles.get(column.fill_toggle):
+                fills[col] = highlight_fill
+        self.plan = StylePlan(self.max_col, formats, fills, spec.wrap)
+
+
+class ReportSpec():
+    '''Declarative description of a Hydraflow report and its xlsx layout'''
+
+    def __init__(self, name, filename, suffix, csv_columns, columns,
+                 col_dims, row_dims, merges=(), replacements=None,
+                 transform=None, wrap=False, checks=None, summary=None):
+        self.name = name
+        self.filename = filename
+        self.suffix = suffix
+        self.csv_columns = csv_columns
+        self.text_columns = csv_columns[:4]
+        self.numeric_columns = csv_columns[4:]
+        self.columns = columns
+        self.col_dims = col_dims
+        self.row_dims = row_dims
+        self.merges = merges
+        self.replacements = replacements or inlet_types
+        self.transform = transform
+        self.wrap = wrap
+        self.checks = checks
+        self.summary = summary or OrderedDict()
+        self.toggles = set(column.toggle or column.fill_toggle
+                           for column in columns
+                           if column.toggle or column.fill_toggle)
+        self._layouts = {}
+
+    def layout(self, toggles):
+        '''Return cached layout compiled for set of toggles'''
+        key = frozenset(name for name in self.toggles if toggles.get(name))
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout = self._layouts[key] = Layout(self, toggles)
+        return layout
+
+
+def pipe_transform(df, resolve=resolve_structures):
+    '''Replace line numbers and n values of pipe dataframe
+
+    Line numbers are replaced with structure names by the resolver, which
+    may also add columns of the pipe network.'''
+
+    # Replace line number with structure name
+    df = resolve(df)
+
+    # Replace n value with material type, keeping n for hydraulic checks
+    df['n_value'] = df['material']
+    df['material'] = 'RCP'
+    return df
+
+
+def parse_report(spec, file):
+    '''Parse Hydraflow csv file into dataframe of raw column values'''
+    return pd.read_csv(file, sep='\t', header=0, names=spec.csv_columns,
+                       dtype={name: str for name in spec.text_columns})
+
+
+def normalize_report(spec, df):
+    '''Replace inlet types, strip markers and resolve parsed dataframe'''
+
+    # Map inlet types of text columns
+    for name in spec.text_columns[1:]:
+        values = df[name]
+        df[name] = values.map(spec.replacements).fillna(values)
+
+    # Count barrels of double pipes before their markers are stripped
+    df.dropna(axis=0, inplace=True)
+    if 'size' in spec.numeric_columns:
+        sizes = df['size']
+        df['barrels'] = 1
+        if sizes.dtype == object:
+            df['barrels'] += sizes.str.endswith(' DOUBLE').astype(int)
+
+    # Strip markers from numeric columns that did not parse as numbers
+    for name in spec.numeric_columns:
+        values = df[name]
+        if values.dtype == object:
+            values = values.str.replace(markers, '', regex=True)
+        df[name] = pd.to_numeric(values, errors='coerce')
+
+    if spec.transform:
+        df = spec.transform(df)
+    return df
+
+
+def read_report(spec, file):
+    '''Read Hydraflow csv file into normalized dataframe'''
+    return normalize_report(spec, parse_report(spec, file))
+
+
+def read_frame(spec, file, series):
+    '''Read series csv file, upload or table into normalized dataframe'''
+    try:
+        if hasattr(file, 'load'):
+            return file.load()
+        elif hasattr(file, 'open'):
+            with file.open() as stream:
+                return read_report(spec, stream)
+        else:
+            return read_report(spec, file)
+    except NetworkError as error:
+        raise NetworkError(''.join([series, ': ', str(error)]))
+
+
+def render_sheet(sheet):
+    '''Render formatted sheet to sheet xml that can be spliced into reports
+
+    Named styles of a layout are indexed in plan order in every
+    workbook, so the sheet keeps its styles in any report workbook.'''
+    return read_sheets(write_workbook([sheet]), [1])[1]
+
+
+def read_rows(spec, file, series, layout, checks=None, summary=False,
+              table=False, render=False):
+    '''Read series csv file, upload or table into rows and violations
+
+    Rows are returned as rendered sheet xml if requested. Also returns
+    the summary columns of the series dataframe and its table bytes if
+    requested, otherwise None, and the number of rows. Tables that were
+    loaded from storage have no bytes, as they are stored already.'''
+    with stage('parse'):
+        df = read_frame(spec, file, series)
+        violations = checks.rows(df, series) if checks else []
+        frame = None
+        if summary:
+            frame = df[list(spec.summary)].rename(columns=spec.summary)
+            frame.insert(0, 'series', series)
+        data = None
+        if table and not hasattr(file, 'load'):
+            data = dump_table(df)
+        rows = df[layout.columns].values.tolist()
+    if render:
+        rows = render_sheet(Sheet(series, series + spec.suffix, rows,
+                                  layout))
+    return rows, violations, frame, data, len(df)
+
+
+def read_worker_rows(*args):
+    '''Read series rows in a worker process, with durations of its stages'''
+    start_timer()
+    try:
+        result = read_rows(*args)
+    finally:
+        timer = finish_timer(observe=False)
+    return result, timer.stages
+
+
+def get_render_pool():
+    '''Return shared process pool for reading and rendering series files'''
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                _render_pool = ProcessPoolExecutor(
+                    max_workers=RENDER_WORKERS, mp_context=process_context())
+    return _render_pool
+
+
+def read_series(spec, files, series_names, layout, checks=None,
+                summary=False, table=False, render=None):
+    '''Read series files in order, across processes for many series
+
+    Series flagged in render are also rendered to sheet xml when they
+    are read by worker processes. Stage durations of the workers are
+    added to the current timer, summed across processes.'''
+    if len(files) < 2 or RENDER_WORKERS < 2:
+        return [read_rows(spec, file, series, layout, checks, summary,
+                          table)
+                for series, file in zip(series_names, files)]
+
+    # Uploads spooled to disk are sent to workers by path only
+    render = render or [False] * len(files)
+    futures = [get_render_pool().submit(
+        read_worker_rows, spec,
+        file if hasattr(file, 'open') or hasattr(file, 'load')
+        else io.BytesIO(file.read()),
+        series, layout, checks, summary, table, flag)
+        for series, file, flag in zip(series_names, files, render)]
+    results = []
+    for future in futures:
+        result, stages = future.result()
+        add_stages(stages)
+        results.append(result)
+    return results
+
+
+def render_report(spec, files, names, toggles, frames=None, cached=None,
+                  tables=None):
+    '''Render report csv files or uploads to formatted xlsx bytes
+
+    Returns None for csv files that cannot be parsed and raises
+    NetworkError for invalid downstream references. Summary columns of
+    each series are appended to frames and table bytes of each series
+    to tables, if given, with None for series that were not parsed or
+    were loaded from tables.
+    Series with sheet xml in the cached list are not styled again, and
+    are only parsed for checks, frames and tables.'''
+    layout = spec.layout(toggles)
+    series_names = [series_name(name) for name in names]
+    checks = spec.checks if toggles.get('checks') else None
+    cached = cached or [None] * len(files)
+    parsed = [i for i, xml in enumerate(cached)
+              if xml is None or checks or frames is not None]
+
+    # Sheets rendered by worker processes are spliced in by position
+    unique = len(set(series_names)) == len(series_names)
+    render = [unique and cached[i] is None for i in parsed]
+
+    # Create and format rows of each series
+    try:
+        results = read_series(spec, [files[i] for i in parsed],
+                              [series_names[i] for i in parsed], layout,
+                              checks, frames is not None, tables is not None,
+                              render)
+
+    except pd.errors.ParserError:
+        print('ParserError')
+        return None
+
+    except ValueError:
+        print('ValueError')
+        return None
+
+    results = dict(zip(parsed, results))
+    count_rows(sum(results[i][4] for i, xml in enumerate(cached)
+                   if xml is None))
+    cached = [results[i][0] if xml is None and
+              isinstance(results[i][0], bytes) else xml
+              for i, xml in enumerate(cached)]
+    rows = [[] if xml is not None else results[i][0]
+            for i, xml in enumerate(cached)]
+    if frames is not None:
+        frames.extend(results[i][2] for i in parsed)
+    if tables is not None:
+        tables.extend(results[i][3] if i in results else None
+                      for i in range(len(files)))
+
+    # Create formatted sheets in series order, cached series as placeholders
+    series_rows = OrderedDict(zip(series_names, rows))
+    sheets = [Sheet(series, series + spec.suffix, values, layout)
+              for series, values in series_rows.items()]
+
+    # Add sheet of hydraulic check violations of all series
+    if checks:
+        violations = [row for i in parsed for row in results[i][1]]
+        sheets.append(Sheet('Violations', 'HYDRAULIC CHECK VIOLATIONS',
+                            violations, checks.spec.layout({})))
+    xlsx_form = write_workbook(sheets)
+
+    # Replace placeholders with rendered and cached sheets of the same position
+    replacements = {sheet: xml for sheet, xml in enumerate(cached, 1)
+                    if xml is not None}
+    if replacements:
+        with stage('splice'):
+            xlsx_form = splice_sheets(xlsx_form, replacements)
+    return xlsx_form
+
+
+def format_report(spec, storage, files, folder_name, names, toggles,
+                  revision=None, keys=None):
+    '''Format report csv files and write the xlsx file to storage
+
+    Sheets of series unchanged since the revision job folder, if given,
+    are reused from its xlsx file, and unchanged series that are parsed
+    again are loaded from its tables. Series keys of the files are
+    hashed unless given.'''
+    if keys is None:
+        with stage('hash'):
+            keys = [series_key(name, file)
+                    for name, file in zip(names, files)]
+
+    # Sheets follow file order only if series names are unique
+    if len(set(series_name(name) for name in names)) < len(names):
+        keys = []
+    cached = None
+    previous = {}
+    if revision is not None and keys:
+        sheets, previous = load_revision(storage, spec, revision, toggles)
+        cached = [sheets.get(key) for key in keys]
+
+        # Tables of series parsed again are fetched concurrently
+        checks = toggles.get('checks')
+        stored = [i for i, (key, xml) in enumerate(zip(keys, cached))
+                  if key in previous and (xml is None or checks)]
+        bodies = storage.get_many([previous[keys[i]] for i in stored])
+        files = list(files)
+        for i, data in zip(stored, bodies):
+            if data is not None:
+                files[i] = StoredTable(data)
+
+    tables = [] if STORE_TABLES else None
+    xlsx_form = render_report(spec, files, names, toggles, cached=cached,
+                              tables=tables)
+    if xlsx_form is None:
+        return None
+
+    # Write formatted xlsx file, series tables and manifest in one batch
+    s3_key_xlsx = ''.join([spec.name, '/', folder_name, '/',
+                           'xlsx', '/', spec.filename])
+    put_keys = [s3_key_xlsx]
+    bodies = [xlsx_form]
+    table_keys = [None] * len(keys)
+    if tables is not None and keys:
+        table_keys = [table_key(spec.name, folder_name, name)
+                      if data is not None else previous.get(key)
+                      for key, name, data in zip(keys, names, tables)]
+        for table, data in zip(table_keys, tables):
+            if data is not None:
+                put_keys.append(table)
+                bodies.append(data)
+    put_keys.append(manifest_key(spec, folder_name))
+    bodies.append(dump_manifest(spec, toggles, s3_key_xlsx, keys, table_keys))
+    storage.put_many(put_keys, bodies)
+
+    # Return storage key
+    return s3_key_xlsx
@@ -0,0 +1,127 @@
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import hashlib
+import io
+import json
+import re
+import zipfile
+
+# Version of sheet layouts, increased whenever formatting changes
+LAYOUT_VERSION = 1
+
+CHUNK_SIZE = 64 * 1024
+
+sheet_path = 'xl/worksheets/sheet{}.xml'
+shared_strings = re.compile(rb'<c ([^>]*?) ?t="s"([^>]*)><v>(\d+)</v></c>')
+main_ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def series_key(name, file):
+    '''Hash series file name and contents of an upload or stream'''
+    digest = hashlib.sha256(name.encode('UTF-8') + b'\0')
+    if hasattr(file, 'open'):
+        stream = file.open()
+    else:
+        stream = file
+        start = stream.tell()
+    try:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    finally:
+        if hasattr(file, 'open'):
+            stream.close()
+        else:
+            stream.seek(start)
+    return digest.hexdigest()
+
+
+def layout_key(spec, toggles):
+    '''Return key of report layout for set of toggles'''
+    names = sorted(name for name in spec.toggles if toggles.get(name))
+    return ' '.join([spec.name, str(LAYOUT_VERSION)] + names)
+
+
+def manifest_key(spec, folder_name):
+    '''Return storage key of the sheet manifest of a job folder'''
+    return ''.join([spec.name, '/', folder_name, '/', 'xlsx', '/',
+                    'manifest.json'])
+
+
+def dump_manifest(spec, toggles, xlsx_key, keys, table_keys):
+    '''Return manifest of series keys, sheets and tables of a report
+
+    The manifest may be written along with its xlsx file and tables, as
+    revisions fall back to formatting series whose files are missing.'''
+    manifest = {'layout': layout_key(spec, toggles), 'xlsx': xlsx_key,
+                'series': [{'key': key, 'sheet': sheet, 'table': table}
+                           for sheet, (key, table)
+                           in enumerate(zip(keys, table_keys), 1)]}
+    return json.dumps(manifest).encode('UTF-8')
+
+
+def read_shared_strings(zf):
+    '''Return shared strings of xlsx archive'''
+    try:
+        root = ElementTree.fromstring(zf.read('xl/sharedStrings.xml'))
+    except KeyError:
+        return []
+    return [''.join(text.text or '' for text in item.iter(main_ns + 't'))
+            for item in root.iter(main_ns + 'si')]
+
+
+def inline_strings(xml, strings):
+    '''Replace shared string references of sheet xml with inline strings'''
+    def inline(match):
+        text = escape(strings[int(match.group(3))]).encode('UTF-8')
+        return b''.join([b'<c ', match.group(1), match.group(2),
+                         b' t="inlineStr"><is><t xml:space="preserve">',
+                         text, b'</t></is></c>'])
+    return shared_strings.sub(inline, xml)
+
+
+def read_sheets(xlsx_form, numbers):
+    '''Return sheet xml of xlsx bytes by sheet number with inline strings'''
+    with zipfile.ZipFile(io.BytesIO(xlsx_form)) as zf:
+        strings = read_shared_strings(zf)
+        return {number: inline_strings(zf.read(sheet_path.format(number)),
+                                       strings)
+                for number in numbers}
+
+
+def load_revision(storage, spec, folder_name, toggles):
+    '''Return sheet xml and table keys of previous job series by series key
+
+    Sheets are only reused from a job formatted with the same layout,
+    tables from any job. Shared strings are inlined so sheets can move
+    to another workbook.'''
+    try:
+        manifest = json.loads(storage.get(manifest_key(spec, folder_name))
+                              .decode('UTF-8'))
+    except KeyError:
+        return {}, {}
+    tables = {series['key']: series['table'] for series in manifest['series']
+              if series.get('table')}
+    if manifest['layout'] != layout_key(spec, toggles):
+        return {}, tables
+    try:
+        xlsx_form = storage.get(manifest['xlsx'])
+    except KeyError:
+        return {}, tables
+
+    xml = read_sheets(xlsx_form,
+                      [series['sheet'] for series in manifest['series']])
+    sheets = {series['key']: xml[series['sheet']]
+              for series in manifest['series']}
+    return sheets, tables
+
+
+def splice_sheets(xlsx_form, sheets):
+    '''Replace sheets of xlsx bytes with sheet xml by sheet number'''
+    paths = {sheet_path.format(sheet): xml for sheet, xml in sheets.items()}
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(xlsx_form)) as source, \
+            zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            target.writestr(info, paths.get(info.filename) or
+                            source.read(info.filename))
+    return output.getvalue()
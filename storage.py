@@ -0,0 +1,224 @@
+from threading import Lock
+from urllib.parse import quote
+from utils import get_env
+from metrics import stage
+from cache import ResultCache
+import hashlib
+import io
+import os
+import shutil
+import stat
+import transfer
+
+URL_CACHE_SIZE = int(get_env('URL_CACHE_SIZE', 1024))
+
+
+class S3Storage():
+    '''Storage of files in an s3 bucket through the shared pooled client
+
+    Presigned urls are cached for half their expiry, so repeated
+    downloads of a key are signed once.'''
+
+    served = False
+    shared = True
+
+    def __init__(self, bucket, expires=100):
+        self.bucket = bucket
+        self.expires = expires
+        self.urls = ResultCache(max_size=URL_CACHE_SIZE, ttl=expires // 2)
+
+    def put(self, key, body):
+        '''Write bytes or upload to key'''
+        return transfer.put_object(transfer.get_client(), self.bucket, key,
+                                   body)
+
+    def put_many(self, keys, bodies):
+        '''Write list of bytes or uploads to keys concurrently'''
+        return transfer.put_objects(transfer.get_client(), self.bucket, keys,
+                                    bodies)
+
+    def request(self, func, key):
+        '''Call transfer function on key, raising KeyError for missing keys'''
+        from botocore.exceptions import ClientError
+        try:
+            return func(transfer.get_client(), self.bucket, key)
+        except ClientError as error:
+            if transfer.missing_key(error):
+                raise KeyError(key)
+            raise
+
+    def open(self, key):
+        '''Return streaming body of key'''
+        return self.request(transfer.open_object, key)
+
+    def get(self, key):
+        '''Read bytes of key'''
+        return self.request(transfer.get_object, key)
+
+    def get_many(self, keys):
+        '''Read bytes of keys concurrently, None for missing keys'''
+        return transfer.get_objects(transfer.get_client(), self.bucket, keys)
+
+    def stat(self, key):
+        '''Return entity tag and size of key'''
+        return self.request(transfer.head_object, key)
+
+    def url(self, key):
+        '''Return cached presigned download url of key'''
+        url = self.urls.get(key)
+        if url is None:
+            url = transfer.get_client().generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket, 'Key': key},
+                ExpiresIn=self.expires)
+            self.urls.set(key, url)
+        return url
+
+
+class LocalStorage():
+    '''Storage of files in a local directory served by the application'''
+
+    served = True
+    shared = True
+
+    def __init__(self, root, url_prefix='/files/'):
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix
+
+    def path(self, key):
+        '''Return file path of key inside the storage root'''
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise KeyError(key)
+        return path
+
+    def put(self, key, body):
+        '''Write bytes or upload to key'''
+        path = self.path(key)
+        with stage('local_put'):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as stream:
+                if hasattr(body, 'open'):
+                    with body.open() as source:
+                        shutil.copyfileobj(source, stream)
+                else:
+                    stream.write(body)
+        return key
+
+    def put_many(self, keys, bodies):
+        '''Write list of bytes or uploads to keys'''
+        return [self.put(key, body) for key, body in zip(keys, bodies)]
+
+    def open(self, key):
+        '''Return binary stream of key'''
+        try:
+            return open(self.path(key), 'rb')
+        except (FileNotFoundError, IsADirectoryError):
+            raise KeyError(key)
+
+    def get(self, key):
+        '''Read bytes of key'''
+        with self.open(key) as stream:
+            return stream.read()
+
+    def get_many(self, keys):
+        '''Read bytes of keys, None for missing keys'''
+        return [read_key(self, key) for key in keys]
+
+    def stat(self, key):
+        '''Return entity tag of modification time and size of key'''
+        try:
+            result = os.stat(self.path(key))
+        except (FileNotFoundError, NotADirectoryError):
+            raise KeyError(key)
+        if not stat.S_ISREG(result.st_mode):
+            raise KeyError(key)
+        return ('{:x}-{:x}'.format(result.st_mtime_ns, result.st_size),
+                result.st_size)
+
+    def url(self, key):
+        '''Return application url serving key'''
+        return self.url_prefix + quote(key)
+
+
+class MemoryStorage():
+    '''Storage of files in memory for benchmarks and local runs
+
+    Files are private to the process, so jobs writing them run in threads
+    of the application process.'''
+
+    served = True
+    shared = False
+
+    def __init__(self, url_prefix='/files/'):
+        self.url_prefix = url_prefix
+        self._files = {}
+        self._lock = Lock()
+
+    def put(self, key, body):
+        '''Write bytes or upload to key'''
+        if hasattr(body, 'open'):
+            with body.open() as stream:
+                body = stream.read()
+        with self._lock:
+            self._files[key] = body
+        return key
+
+    def put_many(self, keys, bodies):
+        '''Write list of bytes or uploads to keys'''
+        return [self.put(key, body) for key, body in zip(keys, bodies)]
+
+    def open(self, key):
+        '''Return binary stream of key'''
+        return io.BytesIO(self.get(key))
+
+    def get(self, key):
+        '''Read bytes of key'''
+        return self._files[key]
+
+    def get_many(self, keys):
+        '''Read bytes of keys, None for missing keys'''
+        return [read_key(self, key) for key in keys]
+
+    def stat(self, key):
+        '''Return entity tag of contents and size of key'''
+        body = self.get(key)
+        return hashlib.sha256(body).hexdigest(), len(body)
+
+    def url(self, key):
+        '''Return application url serving key'''
+        return self.url_prefix + quote(key)
+
+
+def read_key(storage, key):
+    '''Read bytes of storage key, None if it is missing'''
+    try:
+        return storage.get(key)
+    except KeyError:
+        return None
+
+
+_storage = None
+_storage_lock = Lock()
+
+
+def create_storage(backend):
+    '''Create storage backend by name'''
+    if backend == 's3':
+        return S3Storage(get_env('S3_BUCKET'),
+                         int(get_env('S3_URL_EXPIRES', 100)))
+    if backend == 'local':
+        return LocalStorage(get_env('STORAGE_ROOT', 'storage'))
+    if backend == 'memory':
+        return MemoryStorage()
+    raise ValueError('Unknown storage backend: ' + backend)
+
+
+def get_storage():
+    '''Return shared storage backend chosen by STORAGE_BACKEND'''
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage(get_env('STORAGE_BACKEND', 's3'))
+    return _storage
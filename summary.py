@@ -0,0 +1,67 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from reports import Column, ReportSpec
+from workbook import Sheet, write_workbook
+
+summary_spec = ReportSpec(
+    name='summary',
+    filename='Structure Summary.xlsx',
+    suffix='',
+    csv_columns=[],
+    columns=[
+        Column('structure', 'STRUCTURE'),
+        Column('inlet_type', 'INLET TYPE'),
+        Column('struc_to', 'DOWNSTREAM', 'STRUCTURE'),
+        Column('size', 'PIPE SIZE', '(IN)', '0'),
+        Column('slope', 'PIPE SLOPE', '(%)', '0.00'),
+        Column('design_flow', 'Q (TOTAL)', '(CFS)', '0.00'),
+        Column('design_capacity', 'Q (CAPACITY)', '(CFS)', '0.00'),
+        Column('velocity_flow', 'Q (2-YEAR)', '(CFS)', '0.00'),
+        Column('velocity', 'V (2-YEAR)', '(FT/S)', '0.00'),
+        Column('spread_flow', 'Q (INLET)', '(CFS)', '0.00'),
+        Column('spread', 'GUTTER SPREAD', '(FT)', '0.00'),
+        Column('design_series', 'DESIGN SERIES'),
+        Column('velocity_series', 'VELOCITY SERIES'),
+        Column('spread_series', 'SPREAD SERIES')],
+    col_dims={'A': 4.02, 'B': 13.13, 'C': 10.02, 'D': 13.13, 'E': 11.47,
+              'F': 12.24, 'G': 12.24, 'H': 15.24, 'I': 12.24, 'J': 12.24,
+              'K': 12.24, 'L': 15.58, 'M': 17.24, 'N': 17.24, 'O': 17.24},
+    row_dims={1: 13.8, 2: 18, 3: 21, 4: 21})
+
+
+def join_reports(frames):
+    '''Join series summary frames of several reports on structure names
+
+    Structures are hash indexed once, and every report frame is placed
+    by a single index lookup, so the join is linear in the total rows.
+    Structures keep the order in which reports first list them. Values
+    shared by reports are taken from the first report that has them, and
+    only the first row of a structure repeated within a report is kept.'''
+    frames = OrderedDict(
+        (report, pd.concat(series, ignore_index=True).rename(
+            columns={'series': report + '_series'}))
+        for report, series in frames.items())
+    structures = pd.Index(pd.unique(np.concatenate(
+        [frame['structure'].values for frame in frames.values()])))
+
+    columns = OrderedDict([('structure', structures.values)])
+    for frame in frames.values():
+        frame = frame[~frame['structure'].duplicated()]
+        positions = structures.get_indexer(frame['structure'].values)
+        for name in frame.columns.drop('structure'):
+            if name not in columns:
+                columns[name] = np.full(len(structures), None, dtype=object)
+            values = columns[name]
+            missing = pd.isnull(values[positions])
+            values[positions[missing]] = frame[name].values[missing]
+    return pd.DataFrame(columns)
+
+
+def render_summary(frames):
+    '''Render structure summary of report frames to xlsx bytes'''
+    df = join_reports(frames)
+    layout = summary_spec.layout({})
+    rows = df.reindex(columns=layout.columns).values.tolist()
+    sheet = Sheet('Summary', 'STRUCTURE SUMMARY', rows, layout)
+    return write_workbook([sheet])
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import io
+import numpy as np
+import pandas as pd
+
+
+class StoredTable():
+    '''Normalized series dataframe stored as npz bytes'''
+
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        '''Return normalized dataframe of the table'''
+        return load_table(self.data)
+
+
+def table_key(report, folder_name, name):
+    '''Return storage key of the table of a series file'''
+    return ''.join([report, '/', folder_name, '/', 'npz', '/',
+                    name.rsplit('.', 1)[0], '.npz'])
+
+
+def dump_table(df):
+    '''Return normalized dataframe as npz bytes of typed column arrays
+
+    Numeric columns keep their dtype. Text columns are stored as codes
+    into an array of their unique values, and numbers of columns mixing
+    text and numbers as a float array, so no values are pickled.'''
+    arrays = OrderedDict([
+        ('columns', np.array(df.columns, dtype=str)),
+        ('index', df.index.values)])
+    for name in df.columns:
+        values = df[name].values
+        if values.dtype != object:
+            arrays['number:' + name] = values
+            continue
+        numbers = np.array([not isinstance(value, str) for value in values],
+                           dtype=bool)
+        codes, text = pd.factorize(df[name].where(~numbers))
+        arrays['codes:' + name] = codes.astype(np.int32)
+        arrays['text:' + name] = np.array(text, dtype=str)
+        if numbers.any():
+            arrays['number:' + name] = pd.to_numeric(
+                df[name].where(numbers), errors='coerce').values
+    stream = io.BytesIO()
+    np.savez(stream, **arrays)
+    return stream.getvalue()
+
+
+def load_table(data):
+    '''Return normalized dataframe of npz bytes'''
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        files = set(npz.files)
+        columns = OrderedDict()
+        for name in npz['columns']:
+            if 'text:' + name not in files:
+                columns[name] = npz['number:' + name]
+                continue
+            # Numbers have code -1, selecting the appended None
+            codes = npz['codes:' + name]
+            values = np.append(npz['text:' + name].astype(object), None)
+            values = values[codes]
+            if 'number:' + name in files:
+                numbers = codes == -1
+                values[numbers] = npz['number:' + name][numbers]
+            columns[name] = values
+        return pd.DataFrame(columns, index=npz['index'])
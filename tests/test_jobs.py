@@ -0,0 +1,44 @@
+from concurrent.futures import Future
+import pytest
+import metrics
+from jobs import finish_job, process_job
+from metrics import stage, timed
+
+
+def velocity_job(value):
+    '''Time a stage of a velocity job and return its value'''
+    with timed('velocity'):
+        with stage('parse'):
+            return value
+
+
+def failing_job():
+    '''Raise an error of a job'''
+    raise ValueError('bad file')
+
+
+def observed_count(stage_name, report):
+    '''Return number of observations of a stage of a report'''
+    return sum(count for (name, label, _), (_, count, _)
+               in metrics.stage_seconds._series.items()
+               if name == stage_name and label == report)
+
+
+def test_process_job_observed_by_application():
+    future = Future()
+    future.set_result(process_job(velocity_job, 'key'))
+    observed = observed_count('parse', 'velocity')
+    job = Future()
+    finish_job(job, future)
+    assert job.result() == 'key'
+    assert observed_count('parse', 'velocity') == observed + 1
+
+
+def test_process_job_error_passed_on():
+    future = Future()
+    with pytest.raises(ValueError) as error:
+        process_job(failing_job)
+    future.set_exception(error.value)
+    job = Future()
+    finish_job(job, future)
+    assert job.exception() is error.value
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+from network import NetworkError, downstream_index
+
+
+def network_frame(lines, downstream):
+    '''Return line numbers and downstream references as report columns'''
+    return pd.DataFrame({'line': [str(line) for line in lines],
+                         'struc_to': [str(line) for line in downstream]})
+
+
+def test_downstream_index():
+    df = network_frame([1, 2, 3, 4], ['OUT', 1, 2, 1])
+    assert downstream_index(df).tolist() == [-1, 0, 1, 0]
+
+
+def test_downstream_index_after_dropped_rows():
+    df = network_frame([1, 2, 3, 4, 5], ['OUT', 1, 'OUT', 3, 4])
+    df = df.drop([1])
+    assert downstream_index(df).tolist() == [-1, -1, 1, 2]
+
+
+def test_dangling_downstream_line():
+    df = network_frame([1, 2, 3], ['OUT', 1, 9])
+    with pytest.raises(NetworkError, match='not found for lines: 3'):
+        downstream_index(df)
+
+
+def test_downstream_line_of_dropped_row():
+    df = network_frame([1, 2, 3], ['OUT', 1, 2]).drop([1])
+    with pytest.raises(NetworkError, match='not found for lines: 3'):
+        downstream_index(df)
+
+
+def test_cyclic_downstream_lines():
+    df = network_frame([1, 2, 3, 4], ['OUT', 3, 2, 3])
+    with pytest.raises(NetworkError, match='Cyclic') as error:
+        downstream_index(df)
+    assert str(error.value).endswith('lines: 2, 3, 4')
+
+
+def test_duplicate_line_numbers():
+    df = network_frame([1, 2, 2], ['OUT', 1, 1])
+    with pytest.raises(NetworkError, match='Duplicate line numbers: 2'):
+        downstream_index(df)
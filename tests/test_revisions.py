@@ -0,0 +1,67 @@
+import io
+import json
+import os
+import sys
+import openpyxl
+import pytest
+import reports
+from jobs import get_spec
+from storage import MemoryStorage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks'))
+from generate import exports  # noqa: E402
+
+
+def workbook_cells(storage, key):
+    '''Return titles, values and styles of all sheets of a stored xlsx'''
+    workbook = openpyxl.load_workbook(io.BytesIO(storage.get(key)))
+    return [(sheet.title, [[(cell.value, cell.style, cell.number_format)
+                            for cell in row] for row in sheet.iter_rows()])
+            for sheet in workbook.worksheets]
+
+
+def format_files(storage, spec, files, folder_name, toggles, revision=None):
+    '''Format series files of name and bytes into a stored report'''
+    return reports.format_report(
+        spec, storage, [io.BytesIO(data) for _, data in files], folder_name,
+        [name for name, _ in files], toggles, revision)
+
+
+@pytest.fixture(autouse=True)
+def serial_render(monkeypatch):
+    '''Render series in the test process with stored tables'''
+    monkeypatch.setattr(reports, 'RENDER_WORKERS', 1)
+    monkeypatch.setattr(reports, 'STORE_TABLES', True)
+
+
+@pytest.mark.parametrize('report', ['design', 'velocity', 'spread'])
+def test_spliced_revision_matches_fresh_render(report):
+    storage = MemoryStorage()
+    spec = get_spec(report)
+    toggles = {name: True for name in spec.toggles if name != 'checks'}
+    files = [('S_{}.txt'.format(i), exports[report](40, i))
+             for i in range(3)]
+    format_files(storage, spec, files, 'a', toggles)
+
+    files[1] = ('S_1.txt', exports[report](45, 9))
+    spliced = format_files(storage, spec, files, 'b', toggles, 'a')
+    fresh = format_files(storage, spec, files, 'c', toggles)
+    assert workbook_cells(storage, spliced) == workbook_cells(storage, fresh)
+
+
+def test_revision_keeps_tables_of_unchanged_series():
+    storage = MemoryStorage()
+    spec = get_spec('design')
+    toggles = {'checks': True}
+    files = [('S_{}.txt'.format(i), exports['design'](40, i))
+             for i in range(3)]
+    format_files(storage, spec, files, 'a', toggles)
+
+    files[1] = ('S_1.txt', exports['design'](45, 9))
+    format_files(storage, spec, files, 'b', toggles, 'a')
+    manifest = json.loads(storage.get('design/b/xlsx/manifest.json')
+                          .decode('UTF-8'))
+    assert [series['table'] for series in manifest['series']] == [
+        'design/a/npz/S_0.npz', 'design/b/npz/S_1.npz',
+        'design/a/npz/S_2.npz']
@@ -0,0 +1,21 @@
+import io
+import numpy as np
+import pandas as pd
+from tables import dump_table, load_table
+
+
+def test_table_round_trip():
+    df = pd.DataFrame({
+        'line': np.array([1, 2, 3, 4], dtype=np.int64),
+        'flow': [1.5, np.nan, 2.25, 0.0],
+        'inlet_type': ['Curb', 'Grate', 'Curb', 'None'],
+        'size': ['15', 18.0, '24 DOUBLE', np.nan]},
+        columns=['line', 'flow', 'inlet_type', 'size'], index=[0, 2, 5, 6])
+    pd.testing.assert_frame_equal(load_table(dump_table(df)), df)
+
+
+def test_table_without_pickles():
+    df = pd.DataFrame({'text': ['a', 'b'], 'mixed': ['a', 1.0]})
+    data = dump_table(df)
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        assert all(npz[name].dtype != object for name in npz.files)
@@ -0,0 +1,82 @@
+import io
+import zipfile
+from werkzeug.datastructures import FileStorage
+from utils import bundle_validate, close_uploads, error_messages
+
+design_header = '\t'.join('column {}'.format(i) for i in range(21))
+velocity_header = '\t'.join('column {}'.format(i) for i in range(13))
+
+
+def text_file(name, header):
+    '''Return upload of a tab separated file with a single row'''
+    data = ''.join([header, '\n', header, '\n']).encode('UTF-8')
+    return FileStorage(io.BytesIO(data), filename=name)
+
+
+def zip_file(name, members):
+    '''Return upload of a zip archive of member names and headers'''
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for member, header in members:
+            archive.writestr(member, ''.join([header, '\n']))
+    stream.seek(0)
+    return FileStorage(stream, filename=name)
+
+
+def validate(files, max_size=None):
+    '''Return uploaded names by report and error messages of a bundle'''
+    uploads, errors = bundle_validate(files, max_size)
+    names = {report: [upload.name for upload in files]
+             for report, files in uploads.items()}
+    for files in uploads.values():
+        close_uploads(files)
+    return names, error_messages(errors)
+
+
+def test_bundle_classifies_files_by_report():
+    names, errors = validate([
+        text_file('Line 1.txt', design_header),
+        zip_file('project.zip', [('a/Line 2.txt', design_header),
+                                 ('b/Inlets.txt', velocity_header),
+                                 ('readme.md', 'text')])])
+    assert names == {'design': ['Line_1.txt', 'Line_2.txt'],
+                     'velocity': ['Inlets.txt']}
+    assert errors == []
+
+
+def test_bundle_rejects_duplicate_names_in_archive():
+    names, errors = validate([
+        zip_file('project.zip', [('a/Line 1.txt', design_header),
+                                 ('b/Line 1.txt', design_header)])])
+    assert names == {'design': ['Line_1.txt']}
+    assert errors == ['Line 1.txt: Duplicate file name!']
+
+
+def test_bundle_rejects_names_of_the_same_series():
+    names, errors = validate([text_file('A 1.txt', design_header),
+                              text_file('A_1.txt', design_header)])
+    assert names == {'design': ['A_1.txt']}
+    assert errors == ['A_1.txt: Duplicate file name!']
+
+
+def test_bundle_allows_equal_names_of_different_reports():
+    names, errors = validate([text_file('Line.txt', design_header),
+                              text_file('Line.txt', velocity_header)])
+    assert names == {'design': ['Line.txt'], 'velocity': ['Line.txt']}
+    assert errors == []
+
+
+def test_bundle_rejects_unsupported_files():
+    names, errors = validate([text_file('Line.csv', design_header),
+                              text_file('Line.txt', 'a\tb')])
+    assert names == {}
+    assert errors == ['Line.csv: File format not supported!',
+                      'Line.txt: File format not supported!']
+
+
+def test_bundle_checks_archive_members_against_limit():
+    names, errors = validate([
+        zip_file('project.zip', [('Line.txt', design_header * 100)])],
+        max_size=1000)
+    assert names == {}
+    assert errors == ['Files too large!']
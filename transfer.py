@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from utils import get_env
+from metrics import stage
+import io
+
+MAX_POOL_CONNECTIONS = int(get_env('S3_MAX_POOL_CONNECTIONS', 20))
+MAX_WORKERS = int(get_env('S3_TRANSFER_WORKERS', 8))
+MAX_ATTEMPTS = int(get_env('S3_TRANSFER_ATTEMPTS', 3))
+MULTIPART_THRESHOLD = int(get_env('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+
+_client = None
+_transfer_config = None
+_client_lock = Lock()
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+
+def get_client():
+    '''Return shared s3 client with pooled connections
+
+    boto3 is imported on first use to keep it out of application start.'''
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from boto3 import client
+                from botocore.config import Config
+                _client = client('s3', config=Config(
+                    max_pool_connections=MAX_POOL_CONNECTIONS,
+                    retries={'max_attempts': MAX_ATTEMPTS}))
+    return _client
+
+
+def get_transfer_config():
+    '''Return shared multipart transfer configuration'''
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+        _transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_THRESHOLD,
+            max_concurrency=4)
+    return _transfer_config
+
+
+def missing_key(error):
+    '''Return True for s3 errors of keys that do not exist'''
+    response = getattr(error, 'response', {})
+    return response.get('Error', {}).get('Code') in ('NoSuchKey', '404')
+
+
+def put_object(s3, S3_BUCKET, key, body):
+    '''Write bytes or upload to s3, using multipart upload for large bodies
+
+    Failed requests are retried by the client itself.'''
+    with stage('s3_put'):
+        if hasattr(body, 'open'):
+            with body.open() as stream:
+                s3.upload_fileobj(stream, S3_BUCKET, key,
+                                  Config=get_transfer_config())
+        elif len(body) >= MULTIPART_THRESHOLD:
+            s3.upload_fileobj(io.BytesIO(body), S3_BUCKET, key,
+                              Config=get_transfer_config())
+        else:
+            s3.put_object(Bucket=S3_BUCKET, Key=key, Body=body)
+    return key
+
+
+def get_object(s3, S3_BUCKET, key):
+    '''Read bytes from s3'''
+    with stage('s3_get'):
+        return s3.get_object(Bucket=S3_BUCKET, Key=key)['Body'].read()
+
+
+def open_object(s3, S3_BUCKET, key):
+    '''Return streaming body of s3 key'''
+    with stage('s3_get'):
+        return s3.get_object(Bucket=S3_BUCKET, Key=key)['Body']
+
+
+def head_object(s3, S3_BUCKET, key):
+    '''Return entity tag and size of s3 key'''
+    with stage('s3_head'):
+        response = s3.head_object(Bucket=S3_BUCKET, Key=key)
+    return response['ETag'].strip('"'), response['ContentLength']
+
+
+def read_object(s3, S3_BUCKET, key):
+    '''Read bytes from s3, None for keys that do not exist'''
+    from botocore.exceptions import ClientError
+    try:
+        return get_object(s3, S3_BUCKET, key)
+    except ClientError as error:
+        if missing_key(error):
+            return None
+        raise
+
+
+def get_objects(s3, S3_BUCKET, keys):
+    '''Read bytes of s3 keys concurrently, None for missing keys
+
+    The downloads are timed as one stage of the calling thread.'''
+    with stage('s3_get'):
+        futures = [_pool.submit(read_object, s3, S3_BUCKET, key)
+                   for key in keys]
+        return [future.result() for future in futures]
+
+
+def put_objects(s3, S3_BUCKET, keys, bodies):
+    '''Write list of bodies to s3 keys concurrently
+
+    The uploads are timed as one stage of the calling thread, since pool
+    threads have no timer.'''
+    with stage('s3_put'):
+        futures = [_pool.submit(put_object, s3, S3_BUCKET, key, body)
+                   for key, body in zip(keys, bodies)]
+        return [future.result() for future in futures]
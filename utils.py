@@ -1,19 +1,75 @@
 from werkzeug.datastructures import FileStorage
-from openpyxl.styles import Border, Side
+from werkzeug.utils import secure_filename
+from collections import namedtuple, OrderedDict
 from datetime import datetime
 from pytz import timezone
+from metrics import stage
 import os
+import io
+import re
 import csv
+import multiprocessing
 import uuid
+import shutil
+import tempfile
+import zipfile
 
+allowed_extensions = ('.txt',)
 
-def get_env(name):
+# Report type of Hydraflow csv files by their number of columns
+report_columns = OrderedDict([('design', 21), ('velocity', 13),
+                              ('spread', 14)])
+
+
+_required = object()
+_config = None
+
+
+def load_config():
+    '''Return settings of local config module, searched for only once'''
+    global _config
+    if _config is None:
+        try:
+            import config
+            _config = config.config
+        except ImportError:
+            _config = {}
+    return _config
+
+
+def get_env(name, default=_required):
     '''Get environment variables dependent on environment'''
     try:
         return os.environ[name]
     except KeyError:
-        import config
-        return config.config[name]
+        try:
+            return load_config()[name]
+        except KeyError:
+            if default is _required:
+                raise
+            return default
+
+
+def env_flag(name, default=False):
+    '''Return boolean environment flag'''
+    value = get_env(name, None)
+    if value is None:
+        return default
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def process_context():
+    '''Return context starting worker processes without forking
+
+    Forking a threaded web process copies locks held by other threads,
+    such as the lock of the shared s3 client, into the worker.'''
+    return multiprocessing.get_context(get_env('PROCESS_START_METHOD',
+                                               'spawn'))
+
+
+# Uploads larger than the spool size are copied to temporary files
+UPLOAD_SPOOL_SIZE = int(get_env('UPLOAD_SPOOL_SIZE', 1024 * 1024))
+COPY_CHUNK_SIZE = 64 * 1024
 
 
 def env_type():
@@ -38,119 +94,208 @@ def create_folder_name():
     return folder_name
 
 
-def cell_border(left, right, top, bottom):
-    '''Create cell border style function'''
-    border = Border(
-        left=Side(border_style=left),
-        right=Side(border_style=right),
-        top=Side(border_style=top),
-        bottom=Side(border_style=bottom))
-    return border
-
-
-class borders():
-    thin = cell_border(
-        'thin', 'thin', 'thin', 'thin')
-    med_top = cell_border(
-        'thin', 'thin', 'medium', 'thin')
-    med_bot = cell_border(
-        'thin', 'thin', 'thin', 'medium')
-    med_left = cell_border(
-        'medium', 'thin', 'thin', 'thin')
-    med_right = cell_border(
-        'thin', 'medium', 'thin', 'thin')
-    med_tlcorner = cell_border(
-        'medium', 'thin', 'medium', 'thin')
-    med_trcorner = cell_border(
-        'thin', 'medium', 'medium', 'thin')
-    med_blcorner = cell_border(
-        'medium', 'thin', 'thin', 'medium')
-    med_brcorner = cell_border(
-        'thin', 'medium', 'thin', 'medium')
-    med_top_bot = cell_border(
-        'thin', 'thin', 'medium', 'medium')
-    med_top_left_bot = cell_border(
-        'medium', 'thin', 'medium', 'medium')
-    med_top_right_bot = cell_border(
-        'thin', 'medium', 'medium', 'medium')
-
-
-def set_border(ws, border, min_row, max_row, min_col, max_col):
-    '''Set border style function'''
-    for row in ws.iter_rows(
-        min_row=min_row, max_row=max_row,
-        min_col=min_col, max_col=max_col
-    ):
-        for cell in row:
-            cell.border = border
-
-
-def set_format(ws, format, min_row, max_row, min_col, max_col):
-    '''Set number format function'''
-    for row in ws.iter_rows(
-        min_row=min_row, max_row=max_row,
-        min_col=min_col, max_col=max_col
-    ):
-        for cell in row:
-            cell.number_format = format
-
-
-def filestorage_validate(files):
-    '''Validate files are FileStorage class'''
-    for file in files:
-        if isinstance(file, FileStorage):
-            pass
-        else:
-            return False
-    return True
+class NetworkError(Exception):
+    '''Invalid downstream reference in a pipe network'''
 
 
-def file_nonempty_validate(files):
-    '''Validate files are nonempty'''
-    for file in files:
-        filename = file.filename.lower()
-        if filename == '':
-            return False
-        else:
-            pass
-    return True
+class Upload():
+    '''Validated upload file held in memory or spooled to disk'''
 
+    def __init__(self, name, data=None, path=None, size=None):
+        self.name = name
+        self.data = data
+        self.path = path
+        self.size = len(data) if data is not None else size
 
-def file_ext_validate(files):
-    '''Validate file extension'''
-    allowed_extensions = ['.txt']
-    for file in files:
-        filename = file.filename.lower()
-        if filename.endswith(tuple(allowed_extensions)):
-            pass
-        else:
-            return False
-    return True
+    def open(self):
+        '''Return new binary stream over upload data'''
+        if self.path:
+            return open(self.path, 'rb')
+        return io.BytesIO(self.data)
 
+    def close(self):
+        '''Remove spooled upload file'''
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
 
-def csv_validate(files, csv_columns):
-    '''Validate format of csv files'''
-    for file in files:
-        lines = file.read().decode('UTF-8').splitlines(True)
-        reader = csv.reader(lines, delimiter='\t')
-        if len(next(reader)) == csv_columns:
-            pass
-        else:
-            return False
+
+def spool_upload(filename, header, stream):
+    '''Copy upload to memory, or to a temporary file past the spool size'''
+    data = header + stream.read(max(UPLOAD_SPOOL_SIZE - len(header), 0))
+    chunk = stream.read(COPY_CHUNK_SIZE)
+    if not chunk:
+        return Upload(secure_filename(filename), data=data)
+    with tempfile.NamedTemporaryFile(prefix='upload-', suffix='.txt',
+                                     delete=False) as spool:
+        spool.write(data)
+        spool.write(chunk)
+        shutil.copyfileobj(stream, spool, COPY_CHUNK_SIZE)
+        size = spool.tell()
+    return Upload(secure_filename(filename), path=spool.name, size=size)
+
+
+def series_name(name):
+    '''Create series name from input file name'''
+    return re.sub('_', ' ', re.sub('.txt', '', name))
+
+
+def close_uploads(uploads):
+    '''Remove spooled files of uploads'''
+    for upload in uploads:
+        upload.close()
+
+
+UploadError = namedtuple('UploadError', ['filename', 'message'])
+
+format_error = 'File format not supported!'
+empty_error = 'No files selected!'
+size_error = 'Files too large!'
+duplicate_error = 'Duplicate file name!'
+
+
+def header_columns(header):
+    '''Return number of tab separated columns in header row'''
+    try:
+        line = header.decode('UTF-8')
+    except UnicodeDecodeError:
+        return 0
+    row = next(csv.reader([line], delimiter='\t'), [])
+    return len(row)
+
+
+def file_validate(file, csv_columns):
+    '''Validate upload file from its header row, reading it once'''
+    if not isinstance(file, FileStorage):
+        return None, UploadError('', format_error)
+    filename = file.filename or ''
+    if filename == '':
+        return None, UploadError('', empty_error)
+    if not filename.lower().endswith(allowed_extensions):
+        return None, UploadError(filename, format_error)
+    file.stream.seek(0)
+    header = file.stream.readline()
+    if header_columns(header) != csv_columns:
+        return None, UploadError(filename, format_error)
+    return spool_upload(filename, header, file.stream), None
+
+
+def size_validate(uploads, errors, max_size):
+    '''Validate total size of uploads against report upload limit'''
+    if max_size and sum(upload.size for upload in uploads) > max_size:
+        errors.append(UploadError('', size_error))
+    if errors:
+        close_uploads(uploads)
+
+
+def form_validate(data, csv_columns, max_size=None):
+    '''Validate upload files in a single pass'''
+    uploads = []
+    errors = []
+    with stage('validate'):
+        for file in data:
+            upload, error = file_validate(file, csv_columns)
+            if error:
+                errors.append(error)
+            else:
+                uploads.append(upload)
+    size_validate(uploads, errors, max_size)
+    return uploads, errors
+
+
+def classify_file(filename, stream, uploads, errors):
+    '''Add project file to uploads of report type matching its header
+
+    Files of one report must have unique series names, as zip archives
+    may hold equally named files in different folders, and file names
+    differing in spaces or underscores name the same series.'''
+    header = stream.readline()
+    columns = header_columns(header)
+    series = series_name(secure_filename(filename))
+    for report, csv_columns in report_columns.items():
+        if columns == csv_columns:
+            if any(series_name(upload.name) == series
+                   for upload in uploads[report]):
+                errors.append(UploadError(filename, duplicate_error))
+                return
+            uploads[report].append(spool_upload(filename, header, stream))
+            return
+    errors.append(UploadError(filename, format_error))
+
+
+def spooled_size(uploads):
+    '''Return total size of classified project uploads'''
+    return sum(upload.size for files in uploads.values() for upload in files)
+
+
+def classify_archive(filename, stream, uploads, errors, max_size=None):
+    '''Classify txt files of a zip archive, False once over the size limit
+
+    Members are checked against the remaining limit by their declared
+    size before they are decompressed, and reading a member never yields
+    more than its declared size.'''
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if not name.lower().endswith(allowed_extensions):
+                    continue
+                if (max_size and
+                        spooled_size(uploads) + member.file_size > max_size):
+                    errors.append(UploadError('', size_error))
+                    return False
+                with archive.open(member) as member_stream:
+                    classify_file(name, member_stream, uploads, errors)
+    except zipfile.BadZipFile:
+        errors.append(UploadError(filename, format_error))
     return True
 
 
-def form_validate(data, csv_columns):
-    if not filestorage_validate(data):
-        flash_message = 'File format not supported!'
-        return flash_message
-    if not file_nonempty_validate(data):
-        flash_message = 'No files selected!'
-        return flash_message
-    if not file_ext_validate(data):
-        flash_message = 'File format not supported!'
-        return flash_message
-    if not csv_validate(data, csv_columns):
-        flash_message = 'File format not supported!'
-        return flash_message
-    return 'validated'
+def bundle_validate(data, max_size=None):
+    '''Validate project files and zip archives, classifying each file
+
+    Files are no longer spooled once the upload limit is exceeded.'''
+    uploads = OrderedDict((report, []) for report in report_columns)
+    errors = []
+    with stage('validate'):
+        for file in data:
+            if not isinstance(file, FileStorage):
+                errors.append(UploadError('', format_error))
+                continue
+            filename = file.filename or ''
+            if filename == '':
+                errors.append(UploadError('', empty_error))
+                continue
+            file.stream.seek(0)
+            if filename.lower().endswith('.zip'):
+                if not classify_archive(filename, file.stream, uploads,
+                                        errors, max_size):
+                    break
+            elif filename.lower().endswith(allowed_extensions):
+                classify_file(filename, file.stream, uploads, errors)
+            else:
+                errors.append(UploadError(filename, format_error))
+            if max_size and spooled_size(uploads) > max_size:
+                break
+    uploads = OrderedDict((report, files) for report, files in uploads.items()
+                          if files)
+    if not uploads and not errors:
+        errors.append(UploadError('', empty_error))
+    size_validate([upload for files in uploads.values() for upload in files],
+                  errors, max_size)
+    return uploads, errors
+
+
+def error_messages(errors):
+    '''Return flash messages for upload errors'''
+    messages = []
+    for error in errors:
+        if error.filename:
+            message = ''.join([error.filename, ': ', error.message])
+        else:
+            message = error.message
+        if message not in messages:
+            messages.append(message)
+    return messages
@@ -0,0 +1,203 @@
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import (
+    PatternFill, Alignment, Font, NamedStyle, Border, Side)
+from metrics import stage
+import io
+
+
+title_fill = PatternFill(fgColor='BFBFBF', bgColor='BFBFBF',
+                         fill_type='solid')
+header_fill = PatternFill(fgColor='D9D9D9', bgColor='D9D9D9',
+                          fill_type='solid')
+highlight_fill = PatternFill(fgColor='dce6f1', bgColor='dce6f1',
+                             fill_type='solid')
+font = Font(size=10, name='Arial')
+bold_font = Font(bold=True, size=10, name='Arial')
+
+
+def cell_border(left, right, top, bottom):
+    '''Create cell border style function'''
+    border = Border(
+        left=Side(border_style=left),
+        right=Side(border_style=right),
+        top=Side(border_style=top),
+        bottom=Side(border_style=bottom))
+    return border
+
+
+class borders():
+    thin = cell_border(
+        'thin', 'thin', 'thin', 'thin')
+    med_top = cell_border(
+        'thin', 'thin', 'medium', 'thin')
+    med_bot = cell_border(
+        'thin', 'thin', 'thin', 'medium')
+    med_left = cell_border(
+        'medium', 'thin', 'thin', 'thin')
+    med_right = cell_border(
+        'thin', 'medium', 'thin', 'thin')
+    med_tlcorner = cell_border(
+        'medium', 'thin', 'medium', 'thin')
+    med_trcorner = cell_border(
+        'thin', 'medium', 'medium', 'thin')
+    med_blcorner = cell_border(
+        'medium', 'thin', 'thin', 'medium')
+    med_brcorner = cell_border(
+        'thin', 'medium', 'thin', 'medium')
+    med_top_bot = cell_border(
+        'thin', 'thin', 'medium', 'medium')
+    med_top_left_bot = cell_border(
+        'medium', 'thin', 'medium', 'medium')
+    med_top_right_bot = cell_border(
+        'thin', 'medium', 'medium', 'medium')
+
+
+class Sheet():
+    '''Report sheet of data rows written with a compiled layout'''
+
+    def __init__(self, name, title, rows, layout):
+        self.name = name
+        self.title = title
+        self.rows = rows
+        self.layout = layout
+
+
+class StylePlan():
+    '''Named style of every row and column role of a report sheet'''
+
+    # Left, middle and right column borders of each row role
+    row_borders = {
+        'title': ('med_top_left_bot', 'med_top_bot', 'med_top_right_bot'),
+        'header': ('med_tlcorner', 'thin', 'med_trcorner'),
+        'units': ('med_left', 'thin', 'med_right'),
+        'first': ('med_tlcorner', 'med_top', 'med_trcorner'),
+        'body': ('med_left', 'thin', 'med_right'),
+        'last': ('med_blcorner', 'med_bot', 'med_brcorner'),
+        'single': ('med_top_left_bot', 'med_top_bot', 'med_top_right_bot')}
+
+    header_fills = {'title': title_fill, 'header': header_fill,
+                    'units': header_fill}
+
+    def __init__(self, max_col, formats, fills, wrap):
+        self.wrap = wrap
+        self.styles = {}
+        self.rows = {}
+        for role, border_names in self.row_borders.items():
+            self.rows[role] = [
+                self.resolve(role, col, max_col, border_names, formats, fills)
+                for col in range(2, max_col + 1)]
+
+    def resolve(self, role, col, max_col, border_names, formats, fills):
+        '''Return named style of cell role, adding it to the plan'''
+        if col == 2:
+            border = border_names[0]
+        elif col == max_col:
+            border = border_names[2]
+        else:
+            border = border_names[1]
+        if role in self.header_fills:
+            bold = True
+            fill = self.header_fills[role]
+            number_format = 'General'
+        else:
+            bold = False
+            fill = fills.get(col)
+            number_format = formats.get(col, 'General')
+        name = ' '.join([
+            'bold' if bold else 'normal',
+            fill.fgColor.rgb if fill else 'none',
+            border, number_format, 'wrap' if self.wrap else 'nowrap'])
+        if name not in self.styles:
+            self.styles[name] = (bold, fill, border, number_format)
+        return name
+
+    def register(self, wb, ws):
+        '''Add named styles of the plan to a workbook
+
+        Cell styles are indexed in plan order before any cell is written,
+        so sheets of one layout are interchangeable between workbooks.'''
+        alignment = Alignment(horizontal='center', vertical='center',
+                              wrapText=self.wrap or None)
+        for name, (bold, fill, border, number_format) in self.styles.items():
+            if name in wb.named_styles:
+                continue
+            style = NamedStyle(name=name, font=bold_font if bold else font,
+                               border=getattr(borders, border),
+                               alignment=alignment,
+                               number_format=number_format)
+            if fill:
+                style.fill = fill
+            wb.add_named_style(style)
+        for name in self.styles:
+            cell = WriteOnlyCell(ws)
+            cell.style = name
+            cell.style_id
+
+
+def cell_value(value):
+    '''Convert dataframe value to cell value'''
+    if value != value:
+        return None
+    return value
+
+
+def styled_cells(ws, values, styles):
+    '''Create row of write-only cells with their named styles'''
+    cells = [None]
+    for value, style in zip(values, styles):
+        cell = WriteOnlyCell(ws, value=cell_value(value))
+        cell.style = style
+        cells.append(cell)
+    return cells
+
+
+def data_role(row, n_rows):
+    '''Return style plan role of data row'''
+    if n_rows == 1:
+        return 'single'
+    if row == 0:
+        return 'first'
+    if row == n_rows - 1:
+        return 'last'
+    return 'body'
+
+
+def write_sheet(wb, sheet):
+    '''Write report sheet to write-only workbook in a single pass'''
+    ws = wb.create_sheet(sheet.name)
+    layout = sheet.layout
+    plan = layout.plan
+    plan.register(wb, ws)
+
+    n_rows = len(sheet.rows)
+
+    # Set dimensions and merged cells before writing rows
+    for key, value in layout.row_dims.items():
+        ws.row_dimensions[key].height = value
+    for key, value in layout.col_dims.items():
+        ws.column_dimensions[key].width = value
+    for merge in layout.merges:
+        ws.merged_cells.add(merge)
+
+    # Write title, header and data rows
+    title = [sheet.title] + [None] * (layout.max_col - 2)
+    ws.append([])
+    ws.append(styled_cells(ws, title, plan.rows['title']))
+    ws.append(styled_cells(ws, layout.headers, plan.rows['header']))
+    ws.append(styled_cells(ws, layout.units, plan.rows['units']))
+    for row, values in enumerate(sheet.rows):
+        styles = plan.rows[data_role(row, n_rows)]
+        ws.append(styled_cells(ws, values, styles))
+
+
+def write_workbook(sheets):
+    '''Write formatted report sheets to xlsx bytes'''
+    wb = Workbook(write_only=True)
+    with stage('style'):
+        for sheet in sheets:
+            write_sheet(wb, sheet)
+    stream_xlsx_form = io.BytesIO()
+    with stage('save'):
+        wb.save(stream_xlsx_form)
+    return stream_xlsx_form.getvalue()